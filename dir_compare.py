@@ -25,12 +25,17 @@ improve -s (stats) accuracy
 import os, os.path, time, re, argparse, shutil, timeit, operator
 import sys, platform, stat
 import filecmp
-from datetime import datetime
+import threading, concurrent.futures, hashlib, sqlite3
+import atexit, csv, json, difflib
+from collections import Counter
+from html import escape
+from urllib.parse import quote
+from contextlib import closing
 from itertools import zip_longest
 
 # displayed when running dir_compare.py -h
-pgm_version = "4.3"
-pgm_date = "Nov-2-2017 09:39"
+pgm_version = "5.4"
+pgm_date = "Oct-27-2026 13:10"
 
 ##########################################################################################################
 
@@ -44,7 +49,8 @@ str_cmp_pgm = None
 # these are regular expressions
 want_regexpr_skip_filelist = True
 regexpr_skip_filelist = ( "~$", "\.swp$","^~\$", "\.tmp$", "Thumbs.db", "\.lnk$", "Destinations-ms$" )
-compiled_regexpr_skip_filelist = []
+# a SkipMatcher of regexpr_skip_filelist, built once by main()
+compiled_regexpr_skip_filelist = None
 
 # the above want_regexpr_skip_filelist is only used in print_diff()
 # if you want to exclude these files from print_same(), print_exclusive_d1(), print_exclusive_d2()
@@ -55,13 +61,13 @@ want_global_skip_filelist = False
 # these are regular expressions
 want_regexpr_skip_dirlist = True
 regexpr_skip_dirlist = ( "cache", "recent", "cookies", "\$recycle.bin" )
-compiled_regexpr_skip_dirlist = []
+compiled_regexpr_skip_dirlist = None
 
 # if want_cmp_pgm is true and cmp_min_ratio > 0, then only show the str_cmp_pgm line for files with
 # ratios >= cmp_min_ratio
 # in other words do not show a str_cmp_pgm for files that are not anywhere similar
 # a number closer to 100 means two files are very similar
-###cmp_min_ratio = 70.00
+cmp_min_ratio = 70.00
 
 # skip difference computation for certain file extensions
 want_skip_diff_list = True
@@ -75,8 +81,15 @@ real_quick_diff_list = (".min.css", ".min.js" )
 # do not run similarity computation on file greater than this size
 # 1 MB = 1 * (1024 * 1024)
 # default is 20 MB
-###want_file_size_diff_limit = True
-###file_size_diff_limit = 20 * ( 1024 * 1024 )
+want_file_size_diff_limit = True
+file_size_diff_limit = 20 * ( 1024 * 1024 )
+
+# -H: at most this many lines of each file are diffed and at most this many hunks are written per HTML file
+# files larger than file_size_diff_limit are not diffed
+# each hunk has html_context_lines unchanged lines before and after the changes
+html_max_lines = 100000
+html_max_hunks = 1000
+html_context_lines = 3
 # hard-coded:end
 
 # verbose: print directory names to STDERR
@@ -89,6 +102,55 @@ want_verbose_dir_print = False
 # controlled by -c cmd line option
 shallow_cmp = True
 
+# compute the similarity ratio of each pair of differing files, in ratio_pool worker processes
+# controlled by -R and --ratio-processes cmd line options
+want_ratio_computation = False
+ratio_pool = None
+
+# number of file pairs compared at the same time, see compare_file_pairs()
+# controlled by -T cmd line option
+compare_threads = 1
+compare_pool = None
+
+# maximum number of files being read at the same time from a single volume (st_dev), 0 for no limit
+# controlled by --per-volume cmd line option
+volume_limit = 0
+volume_semaphores = {}
+volume_lock = threading.Lock()
+
+# (file1, file2): True if their contents are identical, only for pairs whose contents are known
+# so that a pair compared by compare_common_files() is not read again with -c
+# cleared with stat_cache once a pair of directories has been reported
+content_results = {}
+
+# -m: instead of being listed by print_exclusive(), the exclusive files (including the files in exclusive directories)
+# are collected here as (fname, stat result), print_moves() then pairs up the files with the same contents
+want_moves = False
+move_candidates = { "d1":[], "d2":[] }
+
+# N-way mode, used when more than two directories are given: "paths" compared, in "same" in every directory,
+# "different" in at least two, "missing" from at least one, and "missing_N" for each directory N
+nway_counts = {}
+
+# -O: same-size files are compared byte for byte instead of by digest, (file1, file2) => offset of the first difference
+want_offsets = False
+content_offsets = {}
+
+# content comparison pipeline: pairs of different sizes are never read, then the BLAKE2 digests of the first and
+# last PARTIAL_SIZE bytes of each file are compared, and only pairs which still match are hashed in full
+PARTIAL_SIZE = 64 * 1024
+HASH_BUFSIZE = 1024 * 1024
+pipeline_lock = threading.Lock()
+pipeline_counts = { "size":0, "partial":0, "full":0, "exact":0, "bytes":0, "cache_hits":0, "cache_misses":0 }
+
+# digests saved by previous runs, a file whose size, mod time and inode are unchanged is not read again
+# controlled by --cache cmd line option
+hash_cache = None
+
+# os.stat() results of the directories currently being compared, filled in by TreeCompare
+# so that each file is only stat'ed once, cleared after each pair of directories has been reported
+stat_cache = {}
+
 # only show files that have the same file size and timestamp
 # controlled by -i cmd line option
 only_show_same = False
@@ -99,6 +161,7 @@ count_same_files = 0
 count_diff_files = 0
 count_unequal_files = 0
 count_same_contents_files = 0
+count_moved_files = 0
 count_exclusive_d1 = 0
 count_exclusive_d2 = 0
 skipped_files = []
@@ -110,21 +173,30 @@ elapsed_ratio_time = {}
 
 # output difference to html files
 # controlled by -H cmd line option
+# the pages are written by html_pool processes, html_pages holds (name, file1, file2, html_fname, future) for the index page
+# files larger than file_size_diff_limit get no page, their html_fname is None and future is the note shown in the index
 html_output_dir = None
+html_pool = None
+html_pages = []
 
 # Output format type
-# controlled by -t cmd line option
+# controlled by -t and -f cmd line options, tab_file is a RowWriter
 tab_file = None
 ofmt_delim = "\t"
-date_time_fmt = "%a %b %d %H:%M:%S %Y"
+ROW_FORMATS = ("tab", "csv", "jsonl")
+
+# safe_print() output is buffered by a ReportWriter per stream, each one is written out every REPORT_BATCH lines
+REPORT_BATCH = 4096
+report_writers = {}
 
 """
 example csv output:
 comparison_value,dname1,dname2,fname,ratio,fsize1,fsize2,fsize_diff,date1,date2,date_diff
 
 all possible comparison values:
-samemeta,samemeta_diffdata,idential,different,exclusive_d1,exclusive_d2
+samemeta,samemeta_diffdata,idential,different,exclusive_d1,exclusive_d2,moved,same_content
 identical only occurs with -c (compare contents & metadata)
+for moved (-m), dname1 and dname2 hold the old and the new path of the file, and fname its new name
 """
 
 ##########################################################################################################
@@ -132,6 +204,8 @@ identical only occurs with -c (compare contents & metadata)
 textchars = bytearray([0,7,8,9,10,12,13,27]) + bytearray(range(0x20, 0x100))
 textdict = dict(zip_longest(textchars,[''],fillvalue=''))
 is_binary_string = lambda data: True if not len(data) else bool(data.translate(textdict))
+# the same test on the first 1 KB of a file read in binary mode
+is_binary_data = lambda data: bool(data[:1024].translate(None, textchars))
 
 ##########################################################################################################
 
@@ -149,25 +223,346 @@ def file_cmp_shallow(fname1:str, fname2:str) -> bool:
 
 #############################################################################
 
-def file_cmp_exact(fname1:str, fname2:str) -> bool:
-	"""Compare two files byte for byte
+def file_first_difference(fname1:str, fname2:str) -> int:
+	"""Compare two files byte for byte, reading into two buffers which are allocated once per call
+	   (comparing bytearrays uses memcmp; comparing memoryview or mmap slices is done one byte at a time,
+	   which is much slower than reading, so parts of the buffers are compared with bytearray.startswith()
+	   and a memoryview, which is also a memcmp and does not copy the bytes like slicing a bytearray does)
+
+	Returns:
+		the offset of the first byte that differs (the size of the smaller file when one file
+		is the beginning of the other), or -1 when the files are identical
 	"""
 	BUFSIZE=1024*1024
 
-	#if not file_cmp_shallow(fname1, fname2):
-	#	return False
-
-	bufsize = BUFSIZE
-
+	buf1 = bytearray(BUFSIZE)
+	buf2 = bytearray(BUFSIZE)
+	view2 = memoryview(buf2)
+	offset = 0
 	with open(fname1, 'rb') as fp1, open(fname2, 'rb') as fp2:
 		while True:
-			b1 = fp1.read(bufsize)
-			b2 = fp2.read(bufsize)
-			if b1 != b2:
-				return False
-			if not b1:
-				return True
-			
+			n1 = fp1.readinto(buf1)
+			n2 = fp2.readinto(buf2)
+			if n1 == BUFSIZE and n2 == BUFSIZE:
+				if buf1 != buf2:
+					return offset + first_mismatch(buf1, buf2, BUFSIZE)
+				offset += BUFSIZE
+				continue
+
+			# the end of at least one of the files
+			n = min(n1, n2)
+			if not buf1.startswith(view2[:n]):
+				return offset + first_mismatch(buf1, buf2, n)
+			return -1 if n1 == n2 else offset + n
+
+#############################################################################
+
+def first_mismatch(buf1:bytearray, buf2:bytearray, n:int) -> int:
+	"""Returns the index of the first differing byte within the first n bytes of two buffers that are known to differ
+	"""
+	lo, hi = 0, n
+	view2 = memoryview(buf2)
+	# halve the range, comparing buf1[lo:mid] to buf2[lo:mid] in place, then check the last few bytes one at a time
+	while hi - lo > 64:
+		mid = (lo + hi) // 2
+		if not buf1.startswith(view2[lo:mid], lo):
+			hi = mid
+		else:
+			lo = mid
+	for i in range(lo, hi):
+		if buf1[i] != buf2[i]:
+			return i
+	return hi
+
+#############################################################################
+
+class HashCache:
+	"""SQLite file of the partial and full digests of every file hashed by file_digest(), see --cache
+	   rows are read when a file is first looked up and the new digests are written by save()
+	"""
+	VERSION = "1"
+
+	def __init__(self, fname:str):
+		self.fname = fname
+		self.lock = threading.Lock()
+		self.entries = {}
+		self.updates = {}
+		self.ratios = {}
+		self.ratio_updates = {}
+
+		# shared by the compare_pool threads, always used while holding self.lock
+		self.db = sqlite3.connect(fname, check_same_thread=False)
+		with self.db as db:
+			db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+			meta = dict(db.execute("SELECT key, value FROM meta"))
+			if meta.get("version", self.VERSION) != self.VERSION:
+				db.execute("DROP TABLE IF EXISTS digests")
+			db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.VERSION,))
+			db.execute("CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, partial BLOB, full BLOB)")
+			db.execute("CREATE TABLE IF NOT EXISTS ratios (digest1 BLOB, digest2 BLOB, ratio REAL, estimated INTEGER, PRIMARY KEY (digest1, digest2))")
+
+	def get_entry(self, path:str):
+		"""Returns the row of path as (size, mtime_ns, inode, partial, full), or None; must be called while holding self.lock
+		"""
+		if path not in self.entries:
+			row = self.db.execute("SELECT size, mtime_ns, inode, partial, full FROM digests WHERE path = ?", (path,)).fetchone()
+			self.entries[path] = tuple(row) if row else None
+		return self.entries[path]
+
+	def lookup(self, fname:str, st:os.stat_result, partial:bool):
+		"""Returns the saved digest, or None when fname is not in the cache or has changed since
+		"""
+		with self.lock:
+			entry = self.get_entry(os.path.abspath(fname))
+		if entry is None or entry[:3] != (st.st_size, st.st_mtime_ns, st.st_ino):
+			return None
+		return entry[3] if partial else entry[4]
+
+	def update(self, fname:str, st:os.stat_result, partial:bool, digest:bytes):
+		"""Saves a new digest, keeping the other digest of fname when the file has not changed
+		"""
+		path = os.path.abspath(fname)
+		key = (st.st_size, st.st_mtime_ns, st.st_ino)
+		with self.lock:
+			entry = self.get_entry(path)
+			if entry is None or entry[:3] != key:
+				entry = key + (None, None)
+			entry = entry[:3] + ((digest, entry[4]) if partial else (entry[3], digest))
+			self.entries[path] = entry
+			self.updates[path] = entry
+
+	def lookup_ratio(self, digest1:bytes, digest2:bytes, min_ratio:float):
+		"""Returns the saved (ratio, estimated) of two files by their full digests, or None when it has to be computed again
+		"""
+		if digest1 is None or digest2 is None:
+			return None
+		with self.lock:
+			if (digest1, digest2) not in self.ratios:
+				row = self.db.execute("SELECT ratio, estimated FROM ratios WHERE digest1 = ? AND digest2 = ?", (digest1, digest2)).fetchone()
+				self.ratios[(digest1, digest2)] = (row[0], bool(row[1])) if row else None
+			entry = self.ratios[(digest1, digest2)]
+		# an estimate is only good enough while it stays below min_ratio
+		if entry is None or (entry[1] and entry[0] >= min_ratio):
+			return None
+		return entry
+
+	def update_ratio(self, digest1:bytes, digest2:bytes, ratio:float, estimated:bool):
+		with self.lock:
+			self.ratios[(digest1, digest2)] = self.ratio_updates[(digest1, digest2)] = (ratio, estimated)
+
+	def prune(self, db, roots:list, recurse:bool):
+		"""Deletes the rows of the files under roots which this run never looked up, e.g. deleted or renamed files,
+		   then the ratios of digests which no longer belong to any file
+		"""
+		stale = []
+		for root in roots:
+			root = os.path.abspath(root).rstrip(os.sep) + os.sep
+			# every path starting with root, without having to escape LIKE wildcards in the directory names
+			for (path,) in db.execute("SELECT path FROM digests WHERE path >= ? AND path < ?", (root, root[:-1] + chr(ord(os.sep) + 1))):
+				if path in self.entries:
+					continue
+				# without -r, only the files directly in root were compared
+				if recurse or os.path.dirname(path) == root.rstrip(os.sep):
+					stale.append( (path,) )
+		db.executemany("DELETE FROM digests WHERE path = ?", stale)
+		db.execute("DELETE FROM ratios WHERE digest1 NOT IN (SELECT full FROM digests WHERE full IS NOT NULL) OR digest2 NOT IN (SELECT full FROM digests WHERE full IS NOT NULL)")
+
+	def save(self, roots:list=None, recurse:bool=True):
+		"""Writes the digests and ratios added since the cache was opened
+
+		Args:
+			roots: the compared directories, when given the stale rows under them are deleted with prune(),
+			       leave out after an interrupted run, when not every file has been looked up
+
+			recurse: True when the subdirectories of roots were compared too (-r)
+		"""
+		with self.lock, self.db as db:
+			db.executemany("INSERT OR REPLACE INTO digests VALUES (?,?,?,?,?,?)", [ (path,) + entry for path, entry in self.updates.items() ])
+			db.executemany("INSERT OR REPLACE INTO ratios VALUES (?,?,?,?)", [ key + (entry[0], int(entry[1])) for key, entry in self.ratio_updates.items() ])
+			if roots:
+				self.prune(db, roots, recurse)
+			self.updates = {}
+			self.ratio_updates = {}
+
+#############################################################################
+
+def file_digest(fname:str, partial:bool, st:os.stat_result=None) -> bytes:
+	"""Returns the BLAKE2 digest of a file, from hash_cache when possible
+
+	Args:
+		fname: the file name
+
+		partial: if True, only hash the first and the last PARTIAL_SIZE bytes (which is the entire file when it is small enough)
+
+		st: the os.stat() result of fname, needed to use hash_cache
+
+	Returns:
+		a 32 byte digest
+	"""
+	if hash_cache and st:
+		digest = hash_cache.lookup(fname, st, partial)
+		with pipeline_lock:
+			pipeline_counts["cache_hits" if digest else "cache_misses"] += 1
+		if digest:
+			return digest
+
+	h = hashlib.blake2b(digest_size=32)
+	count = 0
+	with open(fname, 'rb') as fp:
+		if partial:
+			data = fp.read(PARTIAL_SIZE)
+			h.update(data)
+			count += len(data)
+			size = os.fstat(fp.fileno()).st_size
+			if size > PARTIAL_SIZE:
+				fp.seek(max(PARTIAL_SIZE, size - PARTIAL_SIZE))
+				data = fp.read(PARTIAL_SIZE)
+				h.update(data)
+				count += len(data)
+		else:
+			buf = bytearray(HASH_BUFSIZE)
+			view = memoryview(buf)
+			while True:
+				n = fp.readinto(buf)
+				if not n:
+					break
+				h.update(view[:n])
+				count += n
+
+	with pipeline_lock:
+		pipeline_counts["bytes"] += count
+
+	digest = h.digest()
+	if hash_cache and st:
+		hash_cache.update(fname, st, partial, digest)
+	return digest
+
+#############################################################################
+
+def file_cmp_digests(fname1:str, fname2:str, st1:os.stat_result, st2:os.stat_result) -> bool:
+	"""Compares two files of the same size, first by their partial digests and then by their full digests
+	"""
+	if file_digest(fname1, True, st1) != file_digest(fname2, True, st2):
+		stage = "partial"
+		identical = False
+	elif st1.st_size <= 2 * PARTIAL_SIZE:
+		# the partial digests already covered every byte
+		stage = "partial"
+		identical = True
+	else:
+		stage = "full"
+		identical = file_digest(fname1, False, st1) == file_digest(fname2, False, st2)
+
+	with pipeline_lock:
+		pipeline_counts[stage] += 1
+	return identical
+
+#############################################################################
+
+def get_volume_semaphore(dev:int) -> threading.Semaphore:
+	"""Returns the semaphore limiting the number of concurrent reads from the volume: dev
+	"""
+	with volume_lock:
+		if dev not in volume_semaphores:
+			volume_semaphores[dev] = threading.Semaphore(volume_limit)
+		return volume_semaphores[dev]
+
+#############################################################################
+
+def cmp_file_pair(pair:tuple, exact:bool):
+	"""Thread body for compare_file_pairs()
+
+	Args:
+		pair: (file1, file2)
+
+		exact: if True, the contents of files with the same size are always compared,
+		       otherwise like filecmp.cmp(): files with the same mode, size and mod time are considered equal
+
+	Returns:
+		True or False, or None if either file could not be read
+	"""
+	fname1, fname2 = pair
+	try:
+		st1 = cached_stat(fname1)
+		st2 = cached_stat(fname2)
+	except OSError:
+		return None
+
+	if stat.S_IFMT(st1.st_mode) != stat.S_IFMT(st2.st_mode) or st1.st_size != st2.st_size:
+		with pipeline_lock:
+			pipeline_counts["size"] += 1
+		return False
+	if not exact and stat.S_IFMT(st1.st_mode) == stat.S_IFREG and st1.st_mtime == st2.st_mtime:
+		return True
+	if pair in content_results:
+		return content_results[pair]
+
+	# acquire in a fixed order, so that two threads can never each hold the semaphore the other one needs
+	semaphores = [get_volume_semaphore(dev) for dev in sorted({st1.st_dev, st2.st_dev})] if volume_limit else []
+	for sem in semaphores:
+		sem.acquire()
+	try:
+		if want_offsets:
+			offset = file_first_difference(fname1, fname2)
+			content_offsets[pair] = offset
+			identical = offset < 0
+			with pipeline_lock:
+				pipeline_counts["exact"] += 1
+				pipeline_counts["bytes"] += 2 * (st1.st_size if identical else offset)
+		else:
+			identical = file_cmp_digests(fname1, fname2, st1, st2)
+	except OSError:
+		return None
+	finally:
+		for sem in reversed(semaphores):
+			sem.release()
+
+	content_results[pair] = identical
+	return identical
+
+#############################################################################
+
+def compare_file_pairs(pairs:list, exact:bool) -> dict:
+	"""Compares many file pairs at the same time using compare_threads threads (see -T and --per-volume)
+	   the reads release the GIL, so threads scale with the number of disks
+
+	Args:
+		pairs: list of (file1, file2) tuples
+
+		exact: see cmp_file_pair()
+
+	Returns:
+		a dictionary of (file1, file2) => True, False or None (unreadable)
+	"""
+	if compare_pool is None or len(pairs) < 2:
+		return { pair:cmp_file_pair(pair,exact) for pair in pairs }
+
+	return dict(zip(pairs, compare_pool.map(cmp_file_pair, pairs, [exact] * len(pairs))))
+
+#############################################################################
+
+def compare_common_files(d1:str, d2:str, common_files:list) -> tuple:
+	"""A parallel version of filecmp.cmpfiles() with shallow=True, which dircmp uses for same_files and diff_files
+
+	Returns:
+		the sorted lists of: same files, different files, files that could not be compared
+	"""
+	names = sorted(common_files)
+	pairs = [ ("%s%s%s" % (d1,os.sep,f), "%s%s%s" % (d2,os.sep,f)) for f in names ]
+	results = compare_file_pairs(pairs, False)
+
+	same, diff, funny = [], [], []
+	for f, pair in zip(names, pairs):
+		identical = results[pair]
+		if identical is None:
+			funny.append(f)
+		elif identical:
+			same.append(f)
+		else:
+			diff.append(f)
+
+	return same, diff, funny
+
 #############################################################################
 
 def get_default_cmp_pgm():
@@ -208,7 +603,94 @@ def get_default_cmp_pgm():
 
 ##########################################################################################################
 
+def cached_stat(fname:str) -> os.stat_result:
+	"""Returns the os.stat() result of fname, from stat_cache when possible
+	"""
+	st = stat_cache.get(fname)
+	return st if st is not None else os.stat(fname)
+
+#############################################################################
+
+class TreeCompare:
+	"""A replacement for filecmp.dircmp: both directories are listed once with os.scandir, the sorted
+	   names are merge-joined, and the stat result of every entry is kept in stat_cache
+	   provides the dircmp attributes used by this program: left, right, left_only, right_only, common_dirs,
+	   common_files, common_funny and subdirs; same_files, diff_files and funny_files are set by process_directories()
+	"""
+
+	def __init__(self, left:str, right:str):
+		self.left = left
+		self.right = right
+		self._subdirs = None
+		self.same_files, self.diff_files, self.funny_files = [], [], []
+		self.left_only, self.right_only = [], []
+		self.common_dirs, self.common_files, self.common_funny = [], [], []
+
+		a = self.list_dir(left)
+		b = self.list_dir(right)
+
+		i = j = 0
+		while i < len(a) or j < len(b):
+			if j >= len(b) or (i < len(a) and a[i][0] < b[j][0]):
+				self.left_only.append(a[i][1])
+				i += 1
+			elif i >= len(a) or b[j][0] < a[i][0]:
+				self.right_only.append(b[j][1])
+				j += 1
+			else:
+				self.classify(a[i][1], a[i][2], b[j][2])
+				i += 1
+				j += 1
+
+	def list_dir(self, dname:str) -> list:
+		"""Returns the sorted (normalized name, name, stat result or None) of every entry, like dircmp the
+		   entries in filecmp.DEFAULT_IGNORES are left out
+		"""
+		entries = []
+		with os.scandir(dname) as it:
+			for entry in it:
+				if entry.name in filecmp.DEFAULT_IGNORES:
+					continue
+				try:
+					st = entry.stat()
+				except OSError:
+					st = None
+				else:
+					stat_cache["%s%s%s" % (dname,os.sep,entry.name)] = st
+				entries.append( (os.path.normcase(entry.name), entry.name, st) )
+		entries.sort()
+		return entries
+
+	def classify(self, name:str, st1:os.stat_result, st2:os.stat_result):
+		"""Adds a name found in both directories to common_dirs, common_files or common_funny
+		"""
+		if st1 is None or st2 is None or stat.S_IFMT(st1.st_mode) != stat.S_IFMT(st2.st_mode):
+			self.common_funny.append(name)
+		elif stat.S_ISDIR(st1.st_mode):
+			self.common_dirs.append(name)
+		elif stat.S_ISREG(st1.st_mode):
+			self.common_files.append(name)
+		else:
+			self.common_funny.append(name)
+
+	@property
+	def subdirs(self) -> dict:
+		"""A TreeCompare for each of the common_dirs, created once when first used
+		"""
+		if self._subdirs is None:
+			self._subdirs = {}
+			for name in self.common_dirs:
+				self._subdirs[name] = TreeCompare(os.path.join(self.left,name), os.path.join(self.right,name))
+		return self._subdirs
+
+##########################################################################################################
+
 def process_directories(d1,d2,diff_only=False,recurse=False):
+	"""Compares and reports a single pair of directories
+
+	Returns:
+		the TreeCompare of d1 and d2, or None when they are excluded by the reg expr skip list
+	"""
 	global count_same_files, count_diff_files, count_unequal_files, count_exclusive_d1, count_exclusive_d2, skipped_files, skipped_directories
 
 	abort = False
@@ -259,15 +741,9 @@ def process_directories(d1,d2,diff_only=False,recurse=False):
 		safe_print()
 		sys.exit(1)
 
-	if want_regexpr_skip_filelist:
-		for r in regexpr_skip_filelist:
-			compiled_regexpr_skip_filelist.append( re.compile(r,re.I))
-
-	if want_regexpr_skip_dirlist:
-		for r in regexpr_skip_dirlist:
-			compiled_regexpr_skip_dirlist.append( re.compile(r,re.I))
-
-	meta =  filecmp.dircmp(d1, d2)
+	meta = TreeCompare(d1, d2)
+	# compare the common files with the thread pool, instead of one at a time like dircmp
+	meta.same_files, meta.diff_files, meta.funny_files = compare_common_files(d1, d2, meta.common_files)
 	
 	dest = sys.stdout
 	if recurse:
@@ -307,11 +783,61 @@ def process_directories(d1,d2,diff_only=False,recurse=False):
 	if recurse:
 		for i in range(0,4): safe_print()
 
+	# only the subdirectories are needed from here on, the pairs of this directory are never looked up again
+	stat_cache.clear()
+	content_results.clear()
+	content_offsets.clear()
+	return meta
+
+##########################################################################################################
+
+class ReportWriter():
+	"""Collects the lines for one output stream and writes them out in batches
+	"""
+	def __init__(self, outfile):
+		self.outfile = outfile
+		self.encoding = outfile.encoding or "utf-8"
+		self.lines = []
+
+	def write(self, line:str):
+		self.lines.append(line)
+		if len(self.lines) >= REPORT_BATCH:
+			self.flush()
+
+	def flush(self):
+		if not self.lines:
+			return
+		# can also use 'replace' instead of 'ignore' for errors= parameter
+		data = "\n".join(self.lines) + "\n"
+		self.lines = []
+		self.outfile.write( data.encode(self.encoding, errors='ignore').decode(self.encoding) )
+		self.outfile.flush()
+
 ##########################################################################################################
 
 def safe_print(data="",outfile=sys.stdout):
-    # can also use 'replace' instead of 'ignore' for errors= parameter
-    print( str(data).encode(sys.stdout.encoding, errors='ignore').decode(sys.stdout.encoding), file=outfile )
+	writer = report_writers.get(outfile)
+	if writer is None:
+		writer = report_writers[outfile] = ReportWriter(outfile)
+	writer.write(str(data))
+
+	# keep STDOUT and STDERR in order when both go to the same terminal
+	if outfile is not sys.stdout:
+		flush_reports()
+
+##########################################################################################################
+
+def flush_reports():
+	"""Writes out everything buffered by safe_print() and the -t file
+	"""
+	if sys.stdout in report_writers:
+		report_writers[sys.stdout].flush()
+	for writer in report_writers.values():
+		writer.flush()
+	if tab_file:
+		tab_file.flush()
+
+atexit.register(flush_reports)
 
 ##########################################################################################################
 
@@ -339,27 +865,88 @@ def find_common(a0,b0):
 
 ##########################################################################################################
 
-def within_regexpr_skip_filelist(fname):
-	# set dbg to a filename fragment (or an entire filename) to debug which files are being skipped
-	dbg = False
+class SkipMatcher:
+	"""All of the regular expressions of a skip list, combined so that each name is only searched once
 
-	for r in compiled_regexpr_skip_filelist:
-		match = r.findall(fname)
-		if len(match): 
-			if dbg: safe_print(":: fname skip positive: %s %s" % (fname, match))
+	A pattern which is just literal text is tested with a string method instead of re: "text$" with endswith(),
+	"^text" with startswith(), "^text$" with == and a bare "text" with in. The remaining patterns are joined
+	into a single alternation.
+	"""
+	METACHARS = ".^$*+?{}[]|()"
+
+	def __init__(self, patterns, flags=re.I):
+		self.ignorecase = bool(flags & re.I)
+		self.exact = set()
+		prefixes, suffixes, self.substrings, others = [], [], [], []
+
+		for pattern in patterns:
+			body = pattern[1:] if pattern.startswith("^") else pattern
+			# a $ after an odd number of backslashes is escaped
+			at_end = body.endswith("$") and (len(body) - 1 - len(body[:-1].rstrip("\\"))) % 2 == 0
+			literal = self.literal(body[:-1] if at_end else body)
+			if not literal or not literal.isascii():
+				others.append(pattern)
+				continue
+			if self.ignorecase:
+				literal = literal.lower()
+
+			if pattern.startswith("^") and at_end:
+				self.exact.add(literal)
+			elif pattern.startswith("^"):
+				prefixes.append(literal)
+			elif at_end:
+				suffixes.append(literal)
+			else:
+				self.substrings.append(literal)
+
+		self.prefixes = tuple(prefixes)
+		self.suffixes = tuple(suffixes)
+		self.regexpr = re.compile("|".join("(?:%s)" % (p) for p in others), flags) if others else None
+
+	@classmethod
+	def literal(cls, body:str):
+		"""Returns the text matched by body, or None when body is not a plain string
+		"""
+		text = []
+		i = 0
+		while i < len(body):
+			c = body[i]
+			if "\\" == c:
+				# escaped punctuation is literal, but \d, \b, \1 etc. are not
+				if i + 1 == len(body) or body[i+1].isalnum():
+					return None
+				text.append(body[i+1])
+				i += 2
+				continue
+			if c in cls.METACHARS:
+				return None
+			text.append(c)
+			i += 1
+		return "".join(text)
+
+	def matches(self, name:str) -> bool:
+		folded = name.lower() if self.ignorecase else name
+		if folded in self.exact or folded.endswith(self.suffixes) or folded.startswith(self.prefixes):
 			return True
+		for text in self.substrings:
+			if text in folded:
+				return True
+		return self.regexpr is not None and self.regexpr.search(name) is not None
 
-	if dbg: safe_print(":: fname skip negative: %s %s" % (fname, match))
-	return False
+##########################################################################################################
+
+def within_regexpr_skip_filelist(fname):
+	# set dbg to True to debug which files are being skipped
+	dbg = False
+
+	match = compiled_regexpr_skip_filelist.matches(fname)
+	if dbg: safe_print(":: fname skip %s: %s" % ("positive" if match else "negative", fname))
+	return match
 
 ##########################################################################################################
 
 def within_regexpr_skip_dirlist(dname):
-	for r in compiled_regexpr_skip_dirlist:
-		match = r.findall(dname)
-		if len(match): return True
-
-	return False
+	return compiled_regexpr_skip_dirlist.matches(dname)
 
 ##########################################################################################################
 
@@ -376,15 +963,16 @@ def print_listing(meta,root=True):
 		quote_right = '"%s"' % (sub.right)
 		msg = "%s %s %s" % (os.path.basename(sys.argv[0]),quote_left,quote_right)
 		safe_print(msg)
-		print_listing( filecmp.dircmp(sub.left,sub.right), False )
+		print_listing( sub, False )
 
 ##########################################################################################################
 
 def recurse_directories(meta, diff_only):
-	for key in sorted(meta.subdirs.keys()):
-		sub = meta.subdirs[key]
-		process_directories( sub.left, sub.right, diff_only=diff_only, recurse=True )
-		recurse_directories( filecmp.dircmp(sub.left,sub.right), diff_only )
+	# each subdirectory is only listed once it is its turn, so that stat_cache only holds a single pair of directories
+	for name in sorted(meta.common_dirs):
+		sub = process_directories( os.path.join(meta.left,name), os.path.join(meta.right,name), diff_only=diff_only, recurse=True )
+		if sub:
+			recurse_directories( sub, diff_only )
 
 ##########################################################################################################
 
@@ -405,8 +993,8 @@ def print_unequal(unequal):
 		count_unequal_files += 1
 		file1 = grp[0]
 		file2 = grp[1]
-		a = os.stat(file1)
-		b = os.stat(file2)
+		a = cached_stat(file1)
+		b = cached_stat(file2)
 
 		tmp=time.localtime(a.st_mtime)
 		g = time.asctime(tmp)
@@ -416,6 +1004,8 @@ def print_unequal(unequal):
 
 		safe_print("%67s    %10s     %24s" % (make_ellipses(file1,67), a.st_size, g))
 		safe_print("%67s    %10s     %24s" % (make_ellipses(file2,67), a.st_size, h))
+		if (file1,file2) in content_offsets:
+			safe_print("%67s    %10s" % ("first difference at byte:", content_offsets[(file1,file2)]))
 		if len(unequal) > 1: safe_print("%67s    %10s     %24s" % ("."*33, "."*9,"."*24))
 		if tab_file:		
 			dirname1 = os.path.dirname(file1)
@@ -425,7 +1015,7 @@ def print_unequal(unequal):
 			basename2 = os.path.basename(file2)
 			basename = basename1 if basename1 == basename2 else "????"
 
-			save_tab_file("samemeta_diffdata",dirname1,dirname2,basename,a.st_size,b.st_size,g,h)
+			save_tab_file("samemeta_diffdata",dirname1,dirname2,basename,a,b)
 
 	safe_print()
 	safe_print()
@@ -450,8 +1040,8 @@ def print_same_contents(same):
 		count_same_contents_files += 1
 		file1 = grp[0]
 		file2 = grp[1]
-		a = os.stat(file1)
-		b = os.stat(file2)
+		a = cached_stat(file1)
+		b = cached_stat(file2)
 
 		tmp=time.localtime(a.st_mtime)
 		g = time.asctime(tmp)
@@ -470,13 +1060,313 @@ def print_same_contents(same):
 			basename2 = os.path.basename(file2)
 			basename = basename1 if basename1 == basename2 else "????"
 
-			save_tab_file("same_content",dirname1,dirname2,basename,a.st_size,b.st_size,g,h)
+			save_tab_file("same_content",dirname1,dirname2,basename,a,b)
 
 	safe_print()
 
 
 ##########################################################################################################
 
+def compute_ratio(fname1:str, fname2:str, quick:bool, min_ratio:float) -> tuple:
+	"""Runs in a ratio_pool process, returns the similarity of two text files as a percentage
+
+	Before the full difflib ratio(), the lines common to both files are counted from their hashes. 2 * common / total
+	is the highest ratio() possible, so when it is already below min_ratio it is returned as an estimate instead.
+
+	Args:
+		fname1, fname2: the files to compare
+
+		quick: use the real_quick_ratio() estimate, see real_quick_diff_list
+
+		min_ratio: cmp_min_ratio
+
+	Returns:
+		(ratio, estimated, digest1, digest2, elapsed seconds), ratio is None for binary files,
+		the digests are the same as file_digest(partial=False)
+	"""
+	time_start = time.perf_counter()
+	with open(fname1, 'rb') as fp: data1 = fp.read()
+	with open(fname2, 'rb') as fp: data2 = fp.read()
+	digest1 = hashlib.blake2b(data1, digest_size=32).digest()
+	digest2 = hashlib.blake2b(data2, digest_size=32).digest()
+
+	if is_binary_data(data1) or is_binary_data(data2):
+		return None, False, digest1, digest2, time.perf_counter() - time_start
+
+	text1 = data1.decode("latin-1")
+	text2 = data2.decode("latin-1")
+	if quick:
+		ratio = difflib.SequenceMatcher(None, text1, text2).real_quick_ratio() * 100
+		return ratio, False, digest1, digest2, time.perf_counter() - time_start
+
+	lines1 = text1.splitlines(keepends=True)
+	lines2 = text2.splitlines(keepends=True)
+	total = len(lines1) + len(lines2)
+	if not total:
+		return 100.0, False, digest1, digest2, time.perf_counter() - time_start
+
+	common = sum( (Counter(map(hash, lines1)) & Counter(map(hash, lines2))).values() )
+	highest = 200.0 * common / total
+	if highest < min_ratio:
+		# without a single common line, the ratio is exactly 0
+		return highest, common > 0, digest1, digest2, time.perf_counter() - time_start
+
+	ratio = difflib.SequenceMatcher(None, lines1, lines2).ratio() * 100
+	return ratio, False, digest1, digest2, time.perf_counter() - time_start
+
+##########################################################################################################
+
+def start_ratios(d1:str, d2:str, files:list, contents:dict) -> dict:
+	"""Submits the differing files of d1 and d2 to ratio_pool, skipping files that are too large or in skip_diff_list
+
+	Returns:
+		fname => a future of compute_ratio(), or (ratio, estimated) from hash_cache
+	"""
+	ratios = {}
+	for f in files:
+		if want_regexpr_skip_filelist and within_regexpr_skip_filelist(f):
+			continue
+		file1 = "%s%s%s" % (d1,os.sep,f)
+		file2 = "%s%s%s" % (d2,os.sep,f)
+		if contents is not None and contents.get((file1,file2)):
+			continue
+		if want_skip_diff_list and file_in_skip_diff_list(file1,file2):
+			continue
+		try:
+			a = cached_stat(file1)
+			b = cached_stat(file2)
+		except OSError:
+			continue
+		if want_file_size_diff_limit and max(a.st_size, b.st_size) > file_size_diff_limit:
+			continue
+
+		if hash_cache:
+			cached = hash_cache.lookup_ratio(hash_cache.lookup(file1,a,False), hash_cache.lookup(file2,b,False), cmp_min_ratio)
+			if cached:
+				ratios[f] = cached
+				continue
+
+		quick = want_real_quick_diff_list and f.lower().endswith(real_quick_diff_list)
+		ratios[f] = ratio_pool.submit(compute_ratio, file1, file2, quick, cmp_min_ratio)
+
+	return ratios
+
+##########################################################################################################
+
+def get_ratio(ratios:dict, f:str, file1:str, file2:str, a:os.stat_result, b:os.stat_result):
+	"""Waits for the ratio of f started by start_ratios()
+
+	Returns:
+		(ratio, estimated), or None when there is no ratio for f
+	"""
+	result = ratios.get(f)
+	if result is None or isinstance(result, tuple):
+		return result
+
+	try:
+		ratio, estimated, digest1, digest2, elapsed = result.result()
+	except OSError as err:
+		dest=sys.stderr
+		safe_print("Error #7092 - unable to compute the similarity ratio of: %s" % (file1), outfile=dest)
+		safe_print(err,outfile=dest)
+		safe_print("",outfile=dest)
+		return None
+
+	if hash_cache:
+		hash_cache.update(file1,a,False,digest1)
+		hash_cache.update(file2,b,False,digest2)
+	if ratio is None:
+		return None
+
+	elapsed_ratio_time[file1] = elapsed
+	if hash_cache:
+		hash_cache.update_ratio(digest1,digest2,ratio,estimated)
+	return ratio, estimated
+
+##########################################################################################################
+
+def format_ratio(ratio) -> str:
+	"""Returns the (ratio, estimated) of get_ratio() as printed in the report and the -t file, "" for None
+
+	An estimate is only the highest the ratio can be and may equal the exact ratio, so it is marked with "<="
+	"""
+	if ratio is None:
+		return ""
+	return "%s%.2f" % ("<=" if ratio[1] else "", ratio[0])
+
+##########################################################################################################
+
+HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%s</title>
+<style>
+body { font-family: sans-serif; }
+table { border-collapse: collapse; font-family: monospace; width: 100%%; }
+td { padding: 0 4px; white-space: pre-wrap; vertical-align: top; }
+td.n { color: #888; text-align: right; width: 4em; }
+tr.hunk td { background: #eef; color: #448; padding: 4px; }
+tr.del td.t1, tr.chg td.t1 { background: #fdd; }
+tr.ins td.t2, tr.chg td.t2 { background: #dfd; }
+</style>
+</head>
+<body>
+"""
+
+HTML_TAIL = """</body>
+</html>
+"""
+
+##########################################################################################################
+
+def write_html_diff(file1:str, file2:str, html_fname:str, max_bytes:int, max_lines:int, max_hunks:int, context:int):
+	"""Runs in an html_pool process, writes a side-by-side HTML page of the differences between two text files
+
+	Each hunk of changes is written as soon as it is found, instead of building the whole page first like
+	difflib.HtmlDiff().make_file() does
+
+	Args:
+		file1, file2: the files to compare, only their first max_lines lines are read
+
+		html_fname: the HTML file to write
+
+		max_bytes: read at most this many bytes of each file, 0 for no limit
+
+		max_hunks: stop writing after this many hunks
+
+		context: number of unchanged lines shown around each change
+
+	Returns:
+		(hunks, lines deleted, lines inserted, note), or None for binary files, no page is written for them
+	"""
+	lines = []
+	truncated = []
+	for fname in (file1, file2):
+		with open(fname, 'rb') as fp:
+			# a bounded read, a file without line breaks would otherwise be read whole as a single line
+			data = fp.read(max_bytes + 1) if max_bytes else fp.read()
+		if is_binary_data(data):
+			return None
+		if max_bytes and len(data) > max_bytes:
+			truncated.append("%s bytes" % (max_bytes))
+			data = data[:max_bytes]
+		data = data.splitlines(keepends=True)
+		if len(data) > max_lines:
+			truncated.append("%s lines" % (max_lines))
+			del data[max_lines:]
+		lines.append([ line.decode("utf-8", errors="replace") for line in data ])
+	lines1, lines2 = lines
+
+	hunks = deleted = inserted = 0
+	note = "only the first %s were compared" % (" and ".join(sorted(set(truncated)))) if truncated else ""
+	row = '<tr class="%s"><td class="n">%s</td><td class="t1">%s</td><td class="n">%s</td><td class="t2">%s</td></tr>\n'
+	matcher = difflib.SequenceMatcher(None, lines1, lines2)
+	with open(html_fname, mode="w", encoding="utf-8") as fp:
+		fp.write(HTML_HEAD % (escape(os.path.basename(file1))))
+		fp.write("<h3>dir 1: %s<br>dir 2: %s</h3>\n<table>\n" % (escape(file1), escape(file2)))
+		for group in matcher.get_grouped_opcodes(context):
+			if hunks == max_hunks:
+				note = "only the first %s hunks are shown" % (max_hunks)
+				break
+			hunks += 1
+			i1, j1 = group[0][1], group[0][3]
+			i2, j2 = group[-1][2], group[-1][4]
+			rows = [ '<tr class="hunk"><td colspan="4">@@ -%s,%s +%s,%s @@</td></tr>\n' % (i1 + 1, i2 - i1, j1 + 1, j2 - j1) ]
+			for tag, i1, i2, j1, j2 in group:
+				if "equal" == tag:
+					for i, j in zip(range(i1, i2), range(j1, j2)):
+						text = escape(lines1[i].rstrip("\r\n"))
+						rows.append(row % ("eq", i + 1, text, j + 1, text))
+					continue
+				deleted += i2 - i1
+				inserted += j2 - j1
+				for i, j in zip_longest(range(i1, i2), range(j1, j2)):
+					cls = "chg" if i is not None and j is not None else ("del" if j is None else "ins")
+					rows.append(row % (cls, "" if i is None else i + 1, "" if i is None else escape(lines1[i].rstrip("\r\n")),
+						"" if j is None else j + 1, "" if j is None else escape(lines2[j].rstrip("\r\n"))))
+			fp.write("".join(rows))
+		fp.write("</table>\n")
+		if not hunks:
+			note = note or "no differences"
+		fp.write("<p>%s hunks, %s lines deleted, %s lines inserted%s</p>\n" % (hunks, deleted, inserted, "; %s" % (escape(note)) if note else ""))
+		fp.write(HTML_TAIL)
+
+	return hunks, deleted, inserted, note
+
+##########################################################################################################
+
+def start_html_diff(file1:str, file2:str):
+	"""Submits the HTML page of file1 and file2 to html_pool, the page is named after the common part of their paths
+	"""
+	common_name = find_common(file1,file2)
+	html_fname = "%s%s%s.html" % (html_output_dir,os.sep,common_name)
+	rootdir = os.path.dirname(html_fname)
+	try:
+		os.makedirs(rootdir,mode=0o777,exist_ok=True)
+	except OSError as err:
+		dest=sys.stderr
+		safe_print("Error #4602 - error while creating directory: %s" % (html_output_dir), outfile=dest)
+		safe_print(err,outfile=dest)
+		safe_print("",outfile=dest)
+		return
+
+	max_bytes = file_size_diff_limit if want_file_size_diff_limit else 0
+	try:
+		if max_bytes and max(cached_stat(file1).st_size, cached_stat(file2).st_size) > max_bytes:
+			# listed in the index without a page
+			html_pages.append( (common_name, file1, file2, None, "not compared, larger than %s bytes" % (max_bytes)) )
+			return
+	except OSError:
+		pass
+
+	future = html_pool.submit(write_html_diff, file1, file2, html_fname, max_bytes, html_max_lines, html_max_hunks, html_context_lines)
+	html_pages.append( (common_name, file1, file2, html_fname, future) )
+
+##########################################################################################################
+
+def write_html_index():
+	"""Waits for the pages started by start_html_diff() and writes index.html in html_output_dir, linking to each of them
+	"""
+	rows = []
+	for name, file1, file2, html_fname, future in sorted(html_pages, key=operator.itemgetter(0)):
+		if html_fname is None:
+			rows.append('<tr><td>%s</td><td class="n"></td><td class="n"></td><td class="n"></td><td>%s</td></tr>\n' % (escape(name), escape(future)))
+			continue
+		try:
+			result = future.result()
+		except (OSError, RuntimeError) as err:
+			dest=sys.stderr
+			safe_print("Error #5395 - unable to create HTML diff file between:", outfile=dest)
+			safe_print("       file1: %s" % (file1), outfile=dest)
+			safe_print("       file2: %s" % (file2), outfile=dest)
+			safe_print(err,outfile=dest)
+			safe_print("",outfile=dest)
+			continue
+		if result is None:
+			continue
+		hunks, deleted, inserted, note = result
+		link = quote(os.path.relpath(html_fname, html_output_dir).replace(os.sep, "/"))
+		rows.append('<tr><td><a href="%s">%s</a></td><td class="n">%s</td><td class="n">%s</td><td class="n">%s</td><td>%s</td></tr>\n' % (link, escape(name), hunks, deleted, inserted, escape(note)))
+
+	index_fname = "%s%sindex.html" % (html_output_dir,os.sep)
+	try:
+		os.makedirs(html_output_dir,mode=0o777,exist_ok=True)
+		with open(index_fname, mode="w", encoding="utf-8") as fp:
+			fp.write(HTML_HEAD % ("differing files"))
+			fp.write("<h3>differing files [%s]</h3>\n<table>\n" % (len(rows)))
+			fp.write('<tr class="hunk"><td>fname</td><td>hunks</td><td>deleted</td><td>inserted</td><td></td></tr>\n')
+			fp.write("".join(rows))
+			fp.write("</table>\n")
+			fp.write(HTML_TAIL)
+	except OSError as err:
+		dest=sys.stderr
+		safe_print("Error #4603 - unable to write: %s" % (index_fname), outfile=dest)
+		safe_print(err,outfile=dest)
+		safe_print("",outfile=dest)
+
+##########################################################################################################
+
 def print_differ(meta,d1,d2):
 	global count_same_files, count_diff_files, count_unequal_files, count_exclusive_d1, count_exclusive_d2, skipped_files, skipped_directories, tab_file
 
@@ -492,9 +1382,9 @@ def print_differ(meta,d1,d2):
 	
 	safe_print("-" * 135)
 	if shallow_cmp:
-		safe_print(" " * 40 + "files that differ [%s] (star denotes newer or larger file; higher ratio denotes more similarity)" % len(meta.diff_files))
+		safe_print(" " * 40 + "files that differ [%s] (star denotes newer or larger file; higher ratio denotes more similarity, <= marks the highest it can be)" % len(meta.diff_files))
 	else:
-		safe_print(" " * 40 + "files that differ (star denotes newer or larger file; higher ratio denotes more similarity)")
+		safe_print(" " * 40 + "files that differ (star denotes newer or larger file; higher ratio denotes more similarity, <= marks the highest it can be)")
 	safe_print("-" * 135)
 	safe_print()
 
@@ -504,6 +1394,15 @@ def print_differ(meta,d1,d2):
 	cmp_results = []
 	actually_same_contents = []
 	files_processed = 0
+
+	contents = None
+	if not shallow_cmp:
+		contents = compare_file_pairs([ ("%s%s%s" % (d1,os.sep,f), "%s%s%s" % (d2,os.sep,f)) for f in meta.diff_files ], True)
+
+	ratios = {}
+	if want_ratio_computation:
+		ratios = start_ratios(d1, d2, sorted(meta.diff_files), contents)
+
 	for f in sorted(meta.diff_files):
 		if want_regexpr_skip_filelist and within_regexpr_skip_filelist(f): 
 			skipped_files.append( "%s%s%s" % (d1,os.sep,f) )
@@ -513,8 +1412,8 @@ def print_differ(meta,d1,d2):
 		file1 = "%s%s%s" % (d1,os.sep,f)
 		file2 = "%s%s%s" % (d2,os.sep,f)
 		try:
-			a = os.stat(file1)
-			b = os.stat(file2)
+			a = cached_stat(file1)
+			b = cached_stat(file2)
 
 			x=" "
 			y=" "
@@ -552,68 +1451,26 @@ def print_differ(meta,d1,d2):
 		if not shallow_cmp:
 			f1 = "%s%s%s" % (d1,os.sep,f)
 			f2 = "%s%s%s" % (d2,os.sep,f)
-			identical = file_cmp_shallow(f1,f2)
+			identical = contents[(f1,f2)]
 			#identical = DC_cmp(f1,f2,shallow=False)
 			if identical:
 				actually_same_contents.append( (f1,f2))
 				continue
 
-		safe_print("%67s    %10s%s    %10s%s      %24s%s    %24s%s" % (make_ellipses(f,67), a.st_size, x, b.st_size, y,  g,j,  h,k))
+		ratio = get_ratio(ratios,f,file1,file2,a,b)
+		r = format_ratio(ratio)
+
+		safe_print("%67s    %10s%s    %10s%s      %24s%s    %24s%s     %6s" % (make_ellipses(f,67), a.st_size, x, b.st_size, y,  g,j,  h,k, r if r else "-"))
 		if tab_file:
-			save_tab_file("different",d1,d2,f,a.st_size,b.st_size,g,h)
+			save_tab_file("different",d1,d2,f,a,b,ratio)
 
-		if want_cmp_pgm and cmp_min_ratio and str_cmp_pgm:
-			if ratio >= cmp_min_ratio - 0.01:
+		if want_cmp_pgm and str_cmp_pgm:
+			if not want_ratio_computation or not cmp_min_ratio or (ratio and ratio[0] >= cmp_min_ratio - 0.01):
 				entry = '%s "%s%s%s" "%s%s%s"' % (str_cmp_pgm,d1,os.sep,f,d2,os.sep,f)
 				cmp_results.append(entry)
 
 		if html_output_dir:
-			html = difflib.HtmlDiff(tabsize=4,wrapcolumn=65)
-
-			valid_read = True
-			try:
-				with open(file1,"r") as fp: file1_data = fp.readlines()
-				with open(file2,"r") as fp: file2_data = fp.readlines()
-			except:
-				#print("Unexpected error #7092:", sys.exc_info()[0])
-				file1_data = []
-				file2_data = []
-				valid_read = False
-
-			if not len(file1_data): valid_read = False
-			if not len(file2_data): valid_read = False
-
-			if valid_read and not is_binary_string(file1_data[0]) and not is_binary_string(file1_data[len(file1_data)-2]):
-				try:
-					diff = html.make_file(file1_data,file2_data,"dir 1","dir 2",True)
-				except RuntimeError as err :
-					dest=sys.stderr
-					tmp1 = "%s%s%s" % (d1,os.sep,f)
-					tmp2 = "%s%s%s" % (d2,os.sep,f)
-					safe_print("Error #5395 - unable to create HTML diff file between:", outfile=dest)
-					safe_print("       file1: %s" % (tmp1))
-					safe_print("       file2: %s" % (tmp2))
-					safe_print(err,outfile=dest)
-					safe_print("",outfile=dest)
-				else:
-					common_name = find_common(file1,file2)
-					html_fname = "%s%s%s.html" % (html_output_dir,os.sep,common_name)
-					rootdir = os.path.dirname(html_fname)
-					#safe_print("html_output_dir: %s    html_fname: %s   rootdir: %s" % (html_output_dir, html_fname,rootdir))
-					try:
-						os.makedirs(rootdir,mode=0o777,exist_ok=True)
-					except OSError as err:
-						dest=sys.stderr
-						safe_print("Error #4602 - error while creating directory: %s" % (html_output_dir), outfile=dest)
-						safe_print(err,outfile=dest)
-						safe_print("",outfile=dest)
-						continue
-					except:
-						print("Unexpected error #2183:", sys.exc_info()[0])
-
-					fp = open(html_fname,mode="w")
-					fp.write(diff)
-					fp.close()
+			start_html_diff(file1,file2)
 		
 	if not files_processed:
 		safe_print("%67s" % ("All files were excluded by the file skip list regular expression."))
@@ -621,7 +1478,10 @@ def print_differ(meta,d1,d2):
 	if want_cmp_pgm and len(cmp_results):
 		safe_print()
 		safe_print("-" * 135)
-		safe_print(" " * 40 + "command-line file compare (ratio >= %4.2f%%)" % (cmp_min_ratio))
+		if want_ratio_computation and cmp_min_ratio:
+			safe_print(" " * 40 + "command-line file compare (ratio >= %4.2f%%)" % (cmp_min_ratio))
+		else:
+			safe_print(" " * 40 + "command-line file compare")
 		safe_print("-" * 135)
 		safe_print()
 		for entry in cmp_results:
@@ -653,6 +1513,9 @@ def print_same(meta,d1,d2):
 	safe_print("%67s    %10s   %24s" % ("fname", "size", "date"))
 	safe_print("%67s    %10s     %24s" % ("="*33, "="*10, "="*24))
 
+	if not shallow_cmp:
+		contents = compare_file_pairs([ ("%s%s%s" % (d1,os.sep,f), "%s%s%s" % (d2,os.sep,f)) for f in meta.same_files ], True)
+
 	for f in sorted(meta.same_files):
 		if want_regexpr_skip_filelist and want_global_skip_filelist and within_regexpr_skip_filelist(f): 
 			skipped_files.append( "%s%s%s" % (d1,os.sep,f) )
@@ -662,15 +1525,15 @@ def print_same(meta,d1,d2):
 		if not shallow_cmp:
 			f1 = "%s%s%s" % (d1,os.sep,f)
 			f2 = "%s%s%s" % (d2,os.sep,f)
-			identical = file_cmp_shallow(f1,f2,shallow=False)
+			identical = contents[(f1,f2)]
 			#identical = DC_cmp(f1,f2,shallow=False)
 			if not identical:
 				actually_different.append( (f1,f2))
 				continue
 
 		try:
-			a = os.stat("%s%s%s" % (d1,os.sep,f))
-			b = os.stat("%s%s%s" % (d2,os.sep,f))
+			a = cached_stat("%s%s%s" % (d1,os.sep,f))
+			b = cached_stat("%s%s%s" % (d2,os.sep,f))
 
 			tmp=time.localtime(b.st_mtime)
 			q = time.asctime(tmp)
@@ -684,7 +1547,7 @@ def print_same(meta,d1,d2):
 		safe_print("%67s    %10s     %24s" % (make_ellipses(f,67), a.st_size, q))
 		if tab_file:
 			comparison_value = "samemeta" if shallow_cmp else "identical"
-			save_tab_file(comparison_value,d1,d2,f,a.st_size,b.st_size,q,q)
+			save_tab_file(comparison_value,d1,d2,f,a,b)
 
 
 	safe_print()
@@ -699,6 +1562,10 @@ def print_exclusive(meta,dname,d0):
 
 	metadir = meta.left_only if "d1" == dname else meta.right_only
 
+	if want_moves:
+		collect_move_candidates(metadir,dname,d0)
+		return
+
 	if not len(metadir):
 		safe_print()
 		safe_print("-" * 135)
@@ -721,18 +1588,344 @@ def print_exclusive(meta,dname,d0):
 		else:
 			count_exclusive_d2 += 1
 
-		a = os.stat("%s%s%s" % (d0,os.sep,f))
+		a = cached_stat("%s%s%s" % (d0,os.sep,f))
 		tmp=time.localtime(a.st_mtime)
 		q = time.asctime(tmp)
 
 		safe_print("%67s    %10s     %24s" % (make_ellipses(f,67), a.st_size, q))
 		if tab_file:
-			if "d1" == dname:
-				save_tab_file("exclusive_d1",d0,"",f,a.st_size,"",q,"")
+			save_tab_file("exclusive_%s" % (dname),d0,"",f,a,None)
+	safe_print(); safe_print()
+
+##########################################################################################################
+
+def collect_move_candidates(metadir,dname,d0):
+	"""Adds the exclusive files of d0, and every file below its exclusive directories, to move_candidates[dname]
+	"""
+	for f in sorted(metadir):
+		if want_regexpr_skip_filelist and want_global_skip_filelist and within_regexpr_skip_filelist(f): 
+			skipped_files.append( "%s%s%s" % (d0,os.sep,f) )
+			continue
+		fname = "%s%s%s" % (d0,os.sep,f)
+		try:
+			st = cached_stat(fname)
+		except OSError:
+			continue
+		if not stat.S_ISDIR(st.st_mode):
+			move_candidates[dname].append( (fname, st) )
+			continue
+
+		for root, dirs, files in os.walk(fname):
+			if want_regexpr_skip_dirlist:
+				dirs[:] = [ d for d in dirs if not within_regexpr_skip_dirlist(os.path.join(root,d)) ]
+			for name in sorted(files):
+				if want_regexpr_skip_filelist and want_global_skip_filelist and within_regexpr_skip_filelist(name):
+					continue
+				try:
+					move_candidates[dname].append( (os.path.join(root,name), os.stat(os.path.join(root,name))) )
+				except OSError:
+					pass
+
+##########################################################################################################
+
+def digest_files(candidates:list, partial:bool) -> list:
+	"""Returns the file_digest() of each (fname, stat result), using the -T thread pool when available
+	   and the same --per-volume limit as cmp_file_pair()
+	"""
+	def worker(candidate):
+		sem = get_volume_semaphore(candidate[1].st_dev) if volume_limit else None
+		if sem:
+			sem.acquire()
+		try:
+			return file_digest(candidate[0], partial, candidate[1])
+		except OSError:
+			# never equal to another digest
+			return candidate[0]
+		finally:
+			if sem:
+				sem.release()
+
+	if compare_pool is None:
+		return [ worker(c) for c in candidates ]
+	return list(compare_pool.map(worker, candidates))
+
+##########################################################################################################
+
+def find_moves() -> list:
+	"""Pairs up the files in move_candidates with identical contents, the candidates are bucketed by size first
+	   so that only files with a possible match are read; empty files are never paired
+
+	Returns:
+		a sorted list of ((fname1, st1), (fname2, st2)), the paired files are removed from move_candidates
+	"""
+	sizes = {}
+	for side in ("d1", "d2"):
+		for candidate in move_candidates[side]:
+			if candidate[1].st_size:
+				sizes.setdefault(candidate[1].st_size, { "d1":[], "d2":[] })[side].append(candidate)
+
+	# files whose size only occurs on one side can not have been moved
+	buckets = [ b for b in sizes.values() if b["d1"] and b["d2"] ]
+	for partial in (True, False):
+		candidates = [ c for b in buckets for side in ("d1", "d2") for c in b[side] ]
+		if not partial:
+			# the partial digest already covered every byte of the smaller files
+			candidates = [ c for c in candidates if c[1].st_size > 2 * PARTIAL_SIZE ]
+		digests = dict(zip( (c[0] for c in candidates), digest_files(candidates, partial) ))
+
+		refined = []
+		for b in buckets:
+			groups = {}
+			for side in ("d1", "d2"):
+				for c in b[side]:
+					key = digests.get(c[0], "small")
+					groups.setdefault(key, { "d1":[], "d2":[] })[side].append(c)
+			refined += [ g for g in groups.values() if g["d1"] and g["d2"] ]
+		buckets = refined
+
+	moves = []
+	for b in buckets:
+		# files which kept their name are paired first
+		unpaired = list(b["d2"])
+		remaining = []
+		for c1 in b["d1"]:
+			match = [ c2 for c2 in unpaired if os.path.basename(c2[0]) == os.path.basename(c1[0]) ]
+			if match:
+				unpaired.remove(match[0])
+				moves.append( (c1, match[0]) )
 			else:
-				save_tab_file("exclusive_d2",d0,"",f,a.st_size,"",q,"")
+				remaining.append(c1)
+		moves += list(zip(remaining, unpaired))
+
+	paired = { c[0] for pair in moves for c in pair }
+	for side in ("d1", "d2"):
+		move_candidates[side] = [ c for c in move_candidates[side] if c[0] not in paired ]
+
+	return sorted(moves)
+
+##########################################################################################################
+
+def print_moves(d1,d2):
+	"""With -m, outputs the files that were moved or renamed between d1 and d2, followed by the remaining exclusive files
+	"""
+	global count_exclusive_d1, count_exclusive_d2, count_moved_files
+
+	moves = find_moves()
+	count_moved_files = len(moves)
+
+	for i in range(0,4): safe_print()
+	safe_print("-" * 135)
+	safe_print(" " * 30 + "files moved or renamed [%s] (directory 1 followed by directory 2)" % (len(moves)))
+	safe_print("-" * 135)
+	safe_print("%67s    %10s   %24s" % ("fname", "size", "date"))
+	safe_print("%67s    %10s     %24s" % ("="*33, "="*10, "="*24))
+	for (file1, a), (file2, b) in moves:
+		g = time.asctime(time.localtime(a.st_mtime))
+		h = time.asctime(time.localtime(b.st_mtime))
+		safe_print("%67s    %10s     %24s" % (make_ellipses(file1,67), a.st_size, g))
+		safe_print("%67s    %10s     %24s" % (make_ellipses(file2,67), b.st_size, h))
+		safe_print("%67s    %10s     %24s" % ("."*33, "."*9,"."*24))
+		if tab_file:
+			# dname1 and dname2 are the full old and new paths, so that a renamed file can be followed
+			save_tab_file("moved",file1,file2,os.path.basename(file2),a,b)
 	safe_print(); safe_print()
 
+	for dname, d0 in (("d1", d1), ("d2", d2)):
+		remaining = move_candidates[dname]
+		for i in range(0,4): safe_print()
+		safe_print("-" * 135)
+		safe_print(" " * 30 + "files exclusively in [%s], not moved: %s" % (len(remaining),d0))
+		safe_print("-" * 135)
+		safe_print("%67s    %10s   %24s" % ("fname", "size", "date"))
+		safe_print("%67s    %10s     %24s" % ("="*33, "="*10, "="*24))
+		for fname, a in sorted(remaining):
+			q = time.asctime(time.localtime(a.st_mtime))
+			safe_print("%67s    %10s     %24s" % (make_ellipses(fname,67), a.st_size, q))
+			if tab_file:
+				save_tab_file("exclusive_%s" % (dname),os.path.dirname(fname),"",os.path.basename(fname),a,None)
+		if "d1" == dname:
+			count_exclusive_d1 += len(remaining)
+		else:
+			count_exclusive_d2 += len(remaining)
+		safe_print(); safe_print()
+
+##########################################################################################################
+
+def list_tree(root:str, recurse:bool) -> dict:
+	"""Lists the regular files below root for the N-way comparison, each directory is read once with os.scandir
+
+	Returns:
+		relative path => os.stat() result
+	"""
+	files = {}
+	pending = [""]
+	while pending:
+		rel = pending.pop()
+		dname = os.path.join(root,rel) if rel else root
+		try:
+			it = os.scandir(dname)
+		except OSError as err:
+			dest=sys.stderr
+			safe_print("Error #6822 - unable to list directory: %s" % (dname), outfile=dest)
+			safe_print(err,outfile=dest)
+			safe_print("",outfile=dest)
+			continue
+
+		with it:
+			for entry in it:
+				if entry.name in filecmp.DEFAULT_IGNORES:
+					continue
+				try:
+					st = entry.stat()
+				except OSError:
+					continue
+				path = os.path.join(rel,entry.name) if rel else entry.name
+				if stat.S_ISREG(st.st_mode):
+					files[path] = st
+				elif stat.S_ISDIR(st.st_mode) and recurse:
+					if want_regexpr_skip_dirlist and within_regexpr_skip_dirlist(entry.path):
+						skipped_directories.append(entry.path)
+						continue
+					pending.append(path)
+	return files
+
+##########################################################################################################
+
+def nway_versions(roots:list, trees:list, paths:list) -> dict:
+	"""Labels each copy of a file with a version letter, identical copies get the same letter, A being the first
+	   version found in directory order
+
+	Copies with the same size are compared by digest, each file is hashed at most once (partial digest first, then
+	full digest only when another copy has the same partial digest). Without -c, copies which all have the same size
+	and mod time are not read, like cmp_file_pair().
+
+	Returns:
+		relative path => list with the version letter of each tree, or None when the tree does not have the file
+	"""
+	keys = {}
+	partial = []
+	for path in paths:
+		by_size = {}
+		for i, tree in enumerate(trees):
+			st = tree.get(path)
+			if st is not None:
+				by_size.setdefault(st.st_size, []).append(i)
+		for size, members in by_size.items():
+			if 1 == len(members):
+				keys[(path,members[0])] = (size, members[0])
+			elif shallow_cmp and 1 == len({ trees[i][path].st_mtime for i in members }):
+				for i in members:
+					keys[(path,i)] = (size, "meta")
+			else:
+				partial += [ (path, i) for i in members ]
+
+	candidates = [ (os.path.join(roots[i],path), trees[i][path]) for path, i in partial ]
+	digests = dict(zip(partial, digest_files(candidates, True)))
+
+	# only the large files whose partial digest matches another copy of the same path are hashed in full
+	seen = Counter( (path, trees[i][path].st_size, digests[(path,i)]) for path, i in partial )
+	full = [ (path, i) for path, i in partial if trees[i][path].st_size > 2 * PARTIAL_SIZE and seen[(path, trees[i][path].st_size, digests[(path,i)])] > 1 ]
+	candidates = [ (os.path.join(roots[i],path), trees[i][path]) for path, i in full ]
+	digests.update( zip(full, digest_files(candidates, False)) )
+	for path, i in partial:
+		keys[(path,i)] = (trees[i][path].st_size, digests[(path,i)])
+
+	versions = {}
+	for path in paths:
+		letters = {}
+		versions[path] = [ letters.setdefault(keys[(path,i)], chr(ord("A") + len(letters))) if path in tree else None for i, tree in enumerate(trees) ]
+	return versions
+
+##########################################################################################################
+
+def compare_nway(roots:list, recurse:bool, diff_only:bool):
+	"""Compares any number of directories at once: each tree is listed once and each file is read at most once,
+	   the report has one row per path with the version of the file in each directory
+
+	Rows of the -t file compare every other directory to the first one, like separate runs with two directories would
+	"""
+	trees = [ list_tree(root, recurse) for root in roots ]
+	paths = sorted(set().union(*trees), key=os.path.normcase)
+	versions = nway_versions(roots, trees, paths)
+
+	for i in range(0,4): safe_print()
+	safe_print("=" * 135)
+	for n, root in enumerate(roots):
+		safe_print("directory %s: %s" % (n+1, root))
+	safe_print("=" * 135)
+	safe_print()
+	safe_print(" " * 30 + "files by version, the same letter denotes identical files, - denotes a missing file")
+	safe_print("-" * 135)
+	safe_print("%67s    %s   %s" % ("fname", " ".join("%5s" % ("dir%s" % (n+1)) for n in range(len(roots))), "status"))
+	safe_print("%67s    %s   %s" % ("="*33, " ".join("="*5 for root in roots), "="*10))
+
+	for key in ["paths", "same", "different", "missing"] + [ "missing_%s" % (n+1) for n in range(len(roots)) ]:
+		nway_counts[key] = 0
+	comparison_same = "samemeta" if shallow_cmp else "identical"
+	for path in paths:
+		letters = versions[path]
+		present = [ v for v in letters if v is not None ]
+		status = []
+		if len(set(present)) > 1:
+			status.append("different")
+		if len(present) < len(letters):
+			status.append("missing")
+		if want_regexpr_skip_filelist and (want_global_skip_filelist or status) and within_regexpr_skip_filelist(os.path.basename(path)):
+			skipped_files.append(path)
+			continue
+
+		nway_counts["paths"] += 1
+		for s in status:
+			nway_counts[s] += 1
+		if not status:
+			nway_counts["same"] += 1
+		for n, v in enumerate(letters):
+			if v is None:
+				nway_counts["missing_%s" % (n+1)] += 1
+
+		if (diff_only and not status) or (only_show_same and status):
+			continue
+		safe_print("%67s    %s   %s" % (make_ellipses(path,67), " ".join("%5s" % (v if v else "-") for v in letters), ", ".join(status) if status else "same"))
+
+		if tab_file:
+			fname = os.path.basename(path)
+			a = trees[0].get(path)
+			for n in range(1, len(roots)):
+				b = trees[n].get(path)
+				dname1 = os.path.dirname(os.path.join(roots[0],path))
+				dname2 = os.path.dirname(os.path.join(roots[n],path))
+				if a is not None and b is not None:
+					save_tab_file(comparison_same if letters[0] == letters[n] else "different",dname1,dname2,fname,a,b)
+				elif a is not None:
+					save_tab_file("exclusive_d1",dname1,"",fname,a,None)
+				elif b is not None:
+					save_tab_file("exclusive_d2",dname2,"",fname,b,None)
+	safe_print(); safe_print()
+
+##########################################################################################################
+
+def print_nway_totals(roots:list):
+	dest = sys.stderr
+	for i in range(0,4): safe_print(outfile=dest)
+	safe_print("=" * 135,outfile=dest)
+	safe_print("%67s" % ("statistical totals"), outfile=dest)
+	safe_print("=" * 135, outfile=dest)
+	for i in range(0,2): safe_print(outfile=dest)
+
+	safe_print("%40s %s" % ("files compared:", nway_counts["paths"]), outfile=dest)
+	safe_print("%40s %s" % ("same in every directory:", nway_counts["same"]), outfile=dest)
+	safe_print("%40s %s" % ("different versions:", nway_counts["different"]), outfile=dest)
+	safe_print("%40s %s" % ("missing from a directory:", nway_counts["missing"]), outfile=dest)
+	for n in range(len(roots)):
+		safe_print("%40s %s" % ("missing from directory %s:" % (n+1), nway_counts["missing_%s" % (n+1)]), outfile=dest)
+	safe_print("%40s %s" % ("skipped files (via reg expr):", len(skipped_files)), outfile=dest)
+	safe_print("%40s %s" % ("skipped directories (via reg expr):", len(skipped_directories)), outfile=dest)
+	safe_print("%40s %s" % ("bytes read:", pipeline_counts["bytes"]), outfile=dest)
+	if hash_cache:
+		safe_print("%40s %s" % ("hash cache hits:", pipeline_counts["cache_hits"]), outfile=dest)
+		safe_print("%40s %s" % ("hash cache misses:", pipeline_counts["cache_misses"]), outfile=dest)
+	for i in range(0,2): safe_print(outfile=dest)
+
 ##########################################################################################################
 
 def make_ellipses(fname, sz):
@@ -777,8 +1970,22 @@ def print_totals(detailed=False, identical=False):
 	safe_print("%40s %s" % ("same contents, possibly different metadata:", count_same_contents_files), outfile=dest)
 	safe_print("%40s %s" % ("exclusive to directory 1:", count_exclusive_d1), outfile=dest)
 	safe_print("%40s %s" % ("exclusive to directory 2:", count_exclusive_d2), outfile=dest)
+	if want_moves:
+		safe_print("%40s %s" % ("moved or renamed files:", count_moved_files), outfile=dest)
 	safe_print("%40s %s" % ("skipped files (via reg expr):", len(skipped_files)), outfile=dest)
 	safe_print("%40s %s" % ("skipped directories (via reg expr):", len(skipped_directories)), outfile=dest)
+	if sum(pipeline_counts.values()):
+		safe_print("%40s %s" % ("content checks, size differs:", pipeline_counts["size"]), outfile=dest)
+		safe_print("%40s %s" % ("content checks, by partial hash:", pipeline_counts["partial"]), outfile=dest)
+		safe_print("%40s %s" % ("content checks, by full hash:", pipeline_counts["full"]), outfile=dest)
+		if want_offsets:
+			safe_print("%40s %s" % ("content checks, byte for byte:", pipeline_counts["exact"]), outfile=dest)
+		safe_print("%40s %s" % ("bytes read:", pipeline_counts["bytes"]), outfile=dest)
+	if hash_cache:
+		lookups = pipeline_counts["cache_hits"] + pipeline_counts["cache_misses"]
+		percent = 100.0 * pipeline_counts["cache_hits"] / lookups if lookups else 0
+		safe_print("%40s %s (%.1f%%)" % ("hash cache hits:", pipeline_counts["cache_hits"], percent), outfile=dest)
+		safe_print("%40s %s" % ("hash cache misses:", pipeline_counts["cache_misses"]), outfile=dest)
 	for i in range(0,2): safe_print(outfile=dest)
 
 	if not detailed: return
@@ -806,15 +2013,91 @@ def print_totals(detailed=False, identical=False):
 
 ##########################################################################################################
 
-def init_tab_file(fname):
-	global tab_file, ofmt_delim 
-	tab_file = fname
+class RowWriter():
+	"""Keeps the -t file open and writes its rows in batches, as tab-delimited text, CSV or JSON lines
 
+	The rows are built from the os.stat() results the report already has, instead of parsing the printed dates back.
+	JSON lines keep the raw numbers: epoch mtimes, sizes in bytes, the mtime difference in seconds and the ratio as a float,
+	with ratio_estimated true when the ratio is only the highest it can be
+	"""
 	header = ( "comparison", "dname1", "dname2", "fname", "ratio", "fsize1", "fsize2", "fsize2 - fsize1", "date1", "date2", "date2 - date1 (d:h:m:s)" )
+	keys = ( "comparison", "dname1", "dname2", "fname", "ratio", "fsize1", "fsize2", "fsize_diff", "date1", "date2", "date_diff" )
+
+	def __init__(self, fname, fmt="tab"):
+		self.fmt = fmt
+		self.rows = []
+		if "tab" == fmt:
+			# the tab-delimited file has always been latin-1
+			self.fp = open(fname,mode="w",encoding="latin-1",errors="replace",newline="")
+			self.fp.write("%s\n" % (ofmt_delim.join(self.header)))
+		else:
+			self.fp = open(fname,mode="w",encoding="utf-8",newline="")
+		if "csv" == fmt:
+			self.csv = csv.writer(self.fp, lineterminator="\n")
+			self.csv.writerow(self.header)
+
+	def add(self, comparison, dname1, dname2, fname, a, b, ratio=None):
+		"""Adds a row for one file, a and b are the os.stat() results of each side, None for an exclusive file
+
+		ratio is the (ratio, estimated) pair from get_ratio(), or None
+		"""
+		if "jsonl" == self.fmt:
+			self.rows.append( self.json_row(comparison, dname1, dname2, fname, a, b, ratio) )
+		else:
+			self.rows.append( self.text_row(comparison, dname1, dname2, fname, a, b, ratio) )
+		if len(self.rows) >= REPORT_BATCH:
+			self.flush()
+
+	def text_row(self, comparison, dname1, dname2, fname, a, b, ratio):
+		"""Returns the row as the strings of the tab-delimited and CSV files
+		"""
+		fsize_diff = date_diff = ""
+		if a is not None and b is not None:
+			fsize_diff = "%s" % (b.st_size - a.st_size)
+			# whole seconds, the same as the printed dates
+			seconds = int(b.st_mtime) - int(a.st_mtime)
+			op = "" if seconds >= 0 else "-"
+			days, rest = divmod(abs(seconds), 86400)
+			date_diff = "%s%04d:%02d:%02d:%02d" % (op, days, rest // 3600, (rest // 60) % 60, rest % 60)
+
+		return ( comparison, dname1, dname2, fname,
+			format_ratio(ratio),
+			"%s" % (a.st_size) if a is not None else "", "%s" % (b.st_size) if b is not None else "", fsize_diff,
+			time.asctime(time.localtime(a.st_mtime)) if a is not None else "",
+			time.asctime(time.localtime(b.st_mtime)) if b is not None else "", date_diff )
+
+	def json_row(self, comparison, dname1, dname2, fname, a, b, ratio):
+		"""Returns the row as a dict of raw values, None where a side has no file
+		"""
+		both = a is not None and b is not None
+		row = dict(zip(self.keys, ( comparison, dname1, dname2, fname,
+			None if ratio is None else float(ratio[0]),
+			a.st_size if a is not None else None, b.st_size if b is not None else None,
+			b.st_size - a.st_size if both else None,
+			a.st_mtime if a is not None else None, b.st_mtime if b is not None else None,
+			b.st_mtime - a.st_mtime if both else None )))
+		row["ratio_estimated"] = None if ratio is None else bool(ratio[1])
+		return row
+
+	def flush(self):
+		if not self.rows:
+			return
+		if "jsonl" == self.fmt:
+			self.fp.write( "".join("%s\n" % (json.dumps(row)) for row in self.rows) )
+		elif "csv" == self.fmt:
+			self.csv.writerows(self.rows)
+		else:
+			self.fp.write( "".join("%s\n" % (ofmt_delim.join(row)) for row in self.rows) )
+		self.rows = []
+		self.fp.flush()
+
+##########################################################################################################
+
+def init_tab_file(fname, fmt="tab"):
+	global tab_file
+
 	try:
-		with open(tab_file,mode="w",encoding="latin-1") as fp:
-			entry = ofmt_delim.join(header)
-			fp.write("%s\n" % (entry))
+		tab_file = RowWriter(fname, fmt)
 	except OSError as err:
 		dest=sys.stderr
 		safe_print("",outfile=dest)
@@ -824,43 +2107,13 @@ def init_tab_file(fname):
 		safe_print("",outfile=dest)
 		sys.exit(1)
 
-
 ##########################################################################################################
 
 # output file format:
-# comparision-type,dname1,dname2,fname,fsize1,fsize2,fsize_diff,date1,fdate2,date_diff
-
-def save_tab_file(comparison, dname1, dname2, fname, fsize1, fsize2, date1, date2):
-	global tab_file, ofmt_delim, date_time_fmt
-	
-	if len(dname1):
-		d1 = datetime.strptime(date1, date_time_fmt)
-	else:
-		fsize_diff = ""
-		date_diff = ""
-
+# comparision-type,dname1,dname2,fname,ratio,fsize1,fsize2,fsize_diff,date1,fdate2,date_diff
 
-	if len(dname2):
-		d2 = datetime.strptime(date2, date_time_fmt)
-	else:
-		fsize_diff = ""
-		date_diff = ""
-
-
-	if len(dname1) and len(dname2):
-		fsize_diff = fsize2 - fsize1
-		op = "" if d2.timestamp() >= d1.timestamp() else "-"
-		# http://stackoverflow.com/a/2119509/452281
-		tdel = abs( (d2-d1) )
-		days, hours, minutes = ( tdel.days, tdel.seconds//3600, (tdel.seconds//60)%60 )
-		# http://stackoverflow.com/a/14190143/452281
-		seconds = int( tdel.total_seconds() % 60 )
-
-		date_diff = "%s%04d:%02d:%02d:%02d" % (op,days, hours, minutes, seconds)
-
-	with open(tab_file,mode="a",encoding="latin-1") as fp:
-		entry = ofmt_delim.join((comparison,dname1,dname2,fname, "%s" % (fsize1), "%s" % (fsize2), "%s" % (fsize_diff), date1, date2, date_diff))
-		fp.write("%s\n" % (entry))
+def save_tab_file(comparison, dname1, dname2, fname, a, b, ratio=None):
+	tab_file.add(comparison, dname1, dname2, fname, a, b, ratio)
 
 ##########################################################################################################
 
@@ -878,10 +2131,13 @@ def print_hard_coded(fname):
 
 def main():
 	global want_verbose_dir_print, shallow_cmp, str_cmp_pgm, only_show_same, html_output_dir, want_ratio_computation
+	global compare_threads, compare_pool, volume_limit, hash_cache, want_offsets, want_moves, ratio_pool, html_pool
+	global compiled_regexpr_skip_filelist, compiled_regexpr_skip_dirlist
 
-	parser = argparse.ArgumentParser(description="Compare files in two directories", epilog="version: %s (%s)" % (pgm_version,pgm_date))
+	parser = argparse.ArgumentParser(description="Compare files in two (or more) directories", epilog="version: %s (%s)" % (pgm_version,pgm_date))
 	parser.add_argument("dname1", help="first directory to compare")
 	parser.add_argument("dname2", help="second directory to compare")
+	parser.add_argument("dnames", help="more directories: each file is compared across all of the directories in a single table", nargs="*")
 	
 	group1 = parser.add_mutually_exclusive_group()
 	group1.add_argument("-r", "--recurse", help="recusively view file differences in directories", action="store_true")
@@ -897,9 +2153,17 @@ def main():
 	parser.add_argument("-p", "--pgm", help="use PGM as your comparision program")
 	parser.add_argument("-H", "--hdir", help="output differences to HTML files using HDIR directory")
 	parser.add_argument("-t", "--tabfile", help="also save tab-delimited results to TABFILE file")
+	parser.add_argument("-f", "--format", help="format of the TABFILE file, default: tab", choices=ROW_FORMATS, default="tab")
 	parser.add_argument("-v", "--verbose", help="print directories being compared to STDERR", action="store_true")
 	parser.add_argument("-s", "--stats", help="print statistical totals to STDERR", action="store_true")
 	parser.add_argument("-S", "--morestats", help="print even more detailed statistical totals to STDERR", action="store_true")
+	parser.add_argument("-T", "--threads", help="number of file pairs to compare at the same time, default: 1", type=int, default=1)
+	parser.add_argument("--per-volume", help="with -T, read at most this many files at the same time from each volume", type=int, default=0)
+	parser.add_argument("-m", "--moves", help="pair up files exclusive to each directory that have the same contents, and report them as moved or renamed", action="store_true")
+	parser.add_argument("-O", "--offset", help="with -c, compare files byte for byte instead of by hash and show where unequal files first differ", action="store_true")
+	parser.add_argument("-R", "--ratio", help="compute the similarity ratio of differing text files", action="store_true")
+	parser.add_argument("--ratio-processes", help="with -R or -H, number of worker processes, default: number of CPUs", type=int, default=0)
+	parser.add_argument("--cache", help="save file digests to the CACHE file, later runs only read files whose size, mod time or inode changed")
 	
 	args = parser.parse_args()
 
@@ -912,11 +2176,22 @@ def main():
 	if args.contents:
 		shallow_cmp = False
 
+	if args.offset:
+		want_offsets = True
+
+	if args.moves:
+		want_moves = True
+
+	if args.ratio:
+		want_ratio_computation = True
+		ratio_pool = concurrent.futures.ProcessPoolExecutor(args.ratio_processes if args.ratio_processes > 0 else None)
+
 	if args.identical:
 		only_show_same = True
 
 	if args.hdir:
 		html_output_dir = args.hdir
+		html_pool = concurrent.futures.ProcessPoolExecutor(args.ratio_processes if args.ratio_processes > 0 else None)
 
 	if args.pgm:
 		str_cmp_pgm = args.pgm
@@ -926,16 +2201,79 @@ def main():
 		get_default_cmp_pgm()
 
 	if args.tabfile:
-		init_tab_file(args.tabfile)
+		init_tab_file(args.tabfile, args.format)
 
-	if not args.recurse:
-		process_directories( args.dname1, args.dname2, diff_only=args.diffonly, recurse=False )
-	"""
-	else:
-		process_directories( args.dname1, args.dname2, diff_only=args.diffonly, recurse=True )
-		meta =  filecmp.dircmp(args.dname1, args.dname2)
-		recurse_directories(meta, args.diffonly)
-	"""
+	if want_regexpr_skip_filelist:
+		compiled_regexpr_skip_filelist = SkipMatcher(regexpr_skip_filelist, re.I)
+
+	if want_regexpr_skip_dirlist:
+		compiled_regexpr_skip_dirlist = SkipMatcher(regexpr_skip_dirlist, re.I)
+
+	if args.threads > 1:
+		compare_threads = args.threads
+		compare_pool = concurrent.futures.ThreadPoolExecutor(compare_threads)
+	volume_limit = max(args.per_volume,0)
+
+	if args.cache:
+		try:
+			hash_cache = HashCache(args.cache)
+		except sqlite3.Error as err:
+			dest=sys.stderr
+			safe_print("",outfile=dest)
+			safe_print("Error #3317 - unable to open hash cache: %s" % (args.cache), outfile=dest)
+			safe_print(err,outfile=dest)
+			safe_print("",outfile=dest)
+			return 1
+
+	roots = [ args.dname1, args.dname2 ] + args.dnames
+	if len(roots) > 2 and (args.moves or args.ratio or args.hdir or args.one or args.two):
+		dest=sys.stderr
+		safe_print("",outfile=dest)
+		safe_print("Error #8150 - -m, -R, -H, -1 and -2 only work with two directories", outfile=dest)
+		safe_print("",outfile=dest)
+		return 1
+
+	if len(roots) > 2:
+		# like process_directories(), before anything is listed
+		for root in roots:
+			if not os.path.isdir(root):
+				safe_print()
+				safe_print()
+				safe_print("Directory path does not exist: %s" % (root))
+				safe_print()
+				safe_print()
+				return 1
+
+	completed = False
+	try:
+		if len(roots) > 2:
+			compare_nway( roots, args.recurse, args.diffonly )
+		elif not args.recurse:
+			process_directories( args.dname1, args.dname2, diff_only=args.diffonly, recurse=False )
+		else:
+			meta = process_directories( args.dname1, args.dname2, diff_only=args.diffonly, recurse=True )
+			if meta:
+				recurse_directories(meta, args.diffonly)
+
+		if want_moves and not args.diffonly and not only_show_same:
+			print_moves(args.dname1, args.dname2)
+
+		if html_pool:
+			write_html_index()
+		completed = True
+	finally:
+		# keep the digests computed so far, even after Ctrl+C, but only prune the rows of unseen files after a full run
+		if hash_cache:
+			hash_cache.save(roots if completed else None, args.recurse)
+		if ratio_pool:
+			ratio_pool.shutdown(cancel_futures=True)
+		if html_pool:
+			html_pool.shutdown(cancel_futures=True)
+
+	if len(roots) > 2:
+		if args.stats or args.morestats:
+			print_nway_totals(roots)
+		return 0
 
 	if args.stats:
 		print_totals(False,args.contents)
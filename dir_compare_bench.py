@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# dir_compare_bench.py
+# Micro-benchmark for the dir_compare.py skip lists
+# -John Taylor
+
+# Times the SkipMatcher of dir_compare.py against the previous one-regular-expression-at-a-time loop,
+# on a reproducible list of synthetic paths
+
+r"""
+examples
+--------
+1) python3 dir_compare_bench.py
+    (one million paths, file names are matched against regexpr_skip_filelist and directories against regexpr_skip_dirlist)
+
+2) python3 dir_compare_bench.py -n 200000 -r 5 --seed 7
+    (fewer paths, best of 5 runs)
+
+notes
+-----
+* about 1 in 20 of the generated names should be skipped, the same as a typical user profile
+* both matchers must skip exactly the same names, otherwise the benchmark lists the differences and stops with an error
+"""
+
+import os, re, sys, argparse, random, time
+from typing import List, Set, Tuple, Callable
+
+import dir_compare
+
+pgm_version = "1.00"
+pgm_date = "Oct-26-2026 09:45"
+
+WORDS = ("alpha", "beta", "docs", "src", "build", "photos", "music", "projects", "reports", "backup", "Temp", "work")
+EXTENSIONS = (".txt", ".py", ".jpg", ".docx", ".xlsx", ".pdf", ".c", ".h", ".log", ".csv")
+# names and directories which are in the default skip lists
+SKIPPED_NAMES = ("notes.txt~", "file.swp", "~$report.docx", "setup.TMP", "Thumbs.db", "shortcut.lnk", "AutomaticDestinations-ms")
+SKIPPED_DIRS = ("Cache", "Recent", "Cookies", "$Recycle.Bin")
+
+#############################################################################
+
+def create_paths(count:int, seed:int) -> List[Tuple[str, str]]:
+	"""Returns count (directory, file name) pairs, the same arguments always return the same paths
+	"""
+	rnd = random.Random(seed)
+	paths = []
+	for i in range(count):
+		parts = [ rnd.choice(WORDS) for _ in range(rnd.randint(1, 6)) ]
+		if rnd.random() < 0.05:
+			parts.insert(rnd.randrange(len(parts) + 1), rnd.choice(SKIPPED_DIRS))
+		if rnd.random() < 0.05:
+			fname = rnd.choice(SKIPPED_NAMES)
+		else:
+			fname = "%s_%d%s" % (rnd.choice(WORDS), i, rnd.choice(EXTENSIONS))
+		paths.append( (os.sep.join(["C:"] + parts), fname) )
+	return paths
+
+#############################################################################
+
+def regexpr_loop(patterns) -> Callable[[str], bool]:
+	"""The skip list test used before SkipMatcher: each compiled regular expression in turn, with findall()
+	"""
+	compiled = [ re.compile(r, re.I) for r in patterns ]
+	def matches(name:str) -> bool:
+		for r in compiled:
+			if len(r.findall(name)):
+				return True
+		return False
+	return matches
+
+#############################################################################
+
+def time_matcher(matches:Callable[[str], bool], names:List[str], repeat:int) -> Tuple[float, Set[int]]:
+	"""Returns the best elapsed seconds of repeat runs and the positions of the matching names in names
+	"""
+	best = None
+	for i in range(repeat):
+		time_start = time.perf_counter()
+		matched = { j for j, name in enumerate(names) if matches(name) }
+		elapsed = time.perf_counter() - time_start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, matched
+
+#############################################################################
+
+def main() -> int:
+	"""Process command-line arguments, create the paths, run the benchmark
+	"""
+	parser = argparse.ArgumentParser(description="Benchmark the dir_compare.py skip list matching", epilog="dir_compare benchmark, version: %s (%s)" % (pgm_version,pgm_date))
+	parser.add_argument("-n", "--paths", help="number of synthetic paths, default: 1000000", type=int, default=1000000)
+	parser.add_argument("-r", "--repeat", help="number of timed runs per matcher, the best one is reported, default: 3", type=int, default=3)
+	parser.add_argument("--seed", help="random number seed, default: 1", type=int, default=1)
+	args = parser.parse_args()
+
+	time_start = time.perf_counter()
+	paths = create_paths(args.paths, args.seed)
+	print("paths           : {:,}".format(len(paths)))
+	print("created in      : %.2f seconds" % (time.perf_counter() - time_start))
+
+	tests = ( ("files", dir_compare.regexpr_skip_filelist, [ p[1] for p in paths ]),
+		("directories", dir_compare.regexpr_skip_dirlist, [ p[0] for p in paths ]) )
+
+	print()
+	print("%-12s %-13s %9s %14s %10s %8s" % ("list", "matcher", "seconds", "names/sec", "skipped", "speedup"))
+	print("%-12s %-13s %9s %14s %10s %8s" % ("-" * 12, "-" * 13, "-" * 9, "-" * 14, "-" * 10, "-" * 8))
+	for name, patterns, names in tests:
+		loop_seconds, loop_matched = time_matcher(regexpr_loop(patterns), names, max(args.repeat, 1))
+		matcher = dir_compare.SkipMatcher(patterns, re.I)
+		seconds, matched = time_matcher(matcher.matches, names, max(args.repeat, 1))
+		if matched != loop_matched:
+			print("Error: SkipMatcher and the regexpr loop skip different %s" % (name), file=sys.stderr)
+			for j in sorted(matched - loop_matched)[:10]:
+				print("    only skipped by SkipMatcher: %s" % (names[j]), file=sys.stderr)
+			for j in sorted(loop_matched - matched)[:10]:
+				print("    only skipped by the regexpr loop: %s" % (names[j]), file=sys.stderr)
+			return 1
+		loop_count, count = len(loop_matched), len(matched)
+
+		print("%-12s %-13s %9.3f %14s %10s %8s" % (name, "regexpr loop", loop_seconds, "{:,.0f}".format(len(names) / loop_seconds), "{:,}".format(loop_count), ""))
+		print("%-12s %-13s %9.3f %14s %10s %7.1fx" % (name, "SkipMatcher", seconds, "{:,.0f}".format(len(names) / seconds), "{:,}".format(count), loop_seconds / seconds))
+
+	return 0
+
+#############################################################################
+
+if "__main__" == __name__:
+	sys.exit( main() )
+
+# end of script
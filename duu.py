@@ -17,6 +17,10 @@ examples
 
 3) python3 duu.py -b -o data.csv c:\Windows
      (bare format, tab-separated, can be imported into a spreadsheet, then sorted)
+     (rows are written to data.csv while the scan is running)
+
+3a) python3 duu.py -q -j -o data.jsonl /home
+     (JSON lines with the raw number of bytes, files and the modification time of each directory)
 
 4) python3 duu.py -b /home | sort -n
      (on Linux, sort the output: smallest directory to largest)
@@ -25,24 +29,735 @@ examples
     (displays status to STDERR every 200 directories, display stats at end, 
     quiet[don't display individual directories], use 4 thread)
     (useful on your SAN and large folders)
+
+6) python3 duu.py -S -q -T 16 -W /mnt/nfs/share
+    (each of the 16 threads lists directories itself with os.scandir, instead of
+    a single os.walk feeding the threads; compare "files per sec" with and without -W)
+
+7) python3 duu.py -c -d 2 -T 8 /mnt/nfs/share
+    (like du: each directory includes the size of everything below it,
+    only the top 2 levels below /mnt/nfs/share are displayed)
+
+8) python3 duu.py -q -S -P -T 8 /mnt/nfs/share
+    (file size statistics plus the 50th, 90th and 99th percentiles, memory use
+    does not grow with the number of files)
+
+9) python3 duu.py -q -e -X "\.git$:node_modules:__pycache__" --processes 4 -T 2 /mnt/nfs/share
+    (each subdirectory of /mnt/nfs/share is scanned by one of 4 processes using 2 threads each,
+    useful when many -X regular expressions or -e make the scan CPU-bound)
+
+10) python3 duu.py -q --top 50 -T 8 /mnt/nfs/share
+    (also display the 50 largest files and the 50 largest directories)
+
+11) python3 duu.py -A atime --cold 80 --cold-days 365 -T 8 /mnt/nfs/share
+    (each directory line also includes the bytes last accessed <30, 30-90, 90-365 and >365 days ago,
+    only directories with at least 80% of their bytes not accessed for a year are displayed)
+
+12) python3 duu.py -q -l /backup/snapshots
+    (files with several hard links are only counted once, and the summary also
+    displays the bytes actually allocated on disk, which is smaller for sparse files)
+
+13) python3 duu.py -q -T 16 -W --progress 10 --progress-file /tmp/scan.json /mnt/nfs/share
+    (every 10 seconds, display the files/sec, dirs/sec, bytes, queue depth and busy threads on STDERR,
+    and replace /tmp/scan.json with the same information, including each thread's current directory)
+    (with --progress-socket PATH, each report is also sent as a JSON line to every client of that Unix socket)
+
+14) python3 duu.py -q --snapshot share-oct-19.snap /mnt/nfs/share
+    python3 duu.py -c --top 20 --compare share-oct-12.snap share-oct-19.snap
+    (save the size of every directory to a compact snapshot file, then compare two of these without
+    rescanning: the directories that grew and shrank the most, plus the new and deleted directories)
+    (with -c, including the size of all subdirectories; with -d, only up to that many levels)
+
+15) from duu import scan, iter_disk_usage
+    result = scan("/home", ext=True, stats=True)
+    print(result.totals.total_bytes, result.totals.file_stats.median(), len(result.directories))
+    for usage in iter_disk_usage("/home", skipdot=True):
+        print(usage.path, usage.file_count, usage.total_bytes)
+    (Python API, scan() returns every directory plus the combined totals, iter_disk_usage() yields each
+    directory as soon as it has been tallied, see DirectoryUsage and ScanResult)
+
+16) python3 duu.py -q -T 8 --index share.idx /mnt/nfs/share
+    (the first run saves every directory to share.idx, later runs only re-list the
+    directories whose modification time has changed; implies -W)
+    (a file that grows in place does not change its directory's modification time,
+    remove the index file to force a full rescan)
 """
 
-import os, re, sys, locale, argparse, time, statistics, concurrent.futures
+import os, re, sys, stat, locale, argparse, time, statistics, concurrent.futures, queue, threading, array, sqlite3, json, math, itertools, heapq, bisect, socket, struct
 from os.path import join, getsize, isdir, splitext
 from collections import defaultdict
+from contextlib import closing
 from datetime import timedelta
-from typing import List, Dict, DefaultDict, Tuple, Any
+from typing import List, Dict, DefaultDict, Tuple, Iterator, Any, Optional
 
-pgm_version = "2.18"
-pgm_date = "Oct-04-2017 15:45"
+pgm_version = "2.31"
+pgm_date = "Oct-20-2026 16:50"
 
-# keep trace of file/directory stats, extensions, and total number of directories processed
-all_stats: Dict[str, Tuple] = {}
-all_extensions: Dict[str, Dict] = {}
-all_dir_count = 0
-all_exclude_count = 0
+# each thread keeps track of its file/directory stats and extensions in its own ScanTotals,
+# these are combined by merge_scan_totals() once the scan has completed
+all_totals: List[Any] = []
+thread_local = threading.local()
 all_regexpr_excludes: List[Any] = []
-all_csv_list = []
+
+# total number of directories processed, only used by -s
+all_dir_counter = itertools.count(1)
+
+# when -c, -d or --snapshot is invoked, every directory is registered here so that totals can be rolled up
+all_tree: Any = None
+
+# -c or -d: directories are displayed by display_cumulative() after the scan, instead of as they are scanned
+want_cumulative = False
+
+# when --index is invoked, the results of the previous run are loaded from this
+all_index: Any = None
+
+# on-disk format of the --index file, an index with a different version is rebuilt
+INDEX_VERSION = "5"
+
+# number of largest files and directories to keep track of, controlled by --top
+top_count = 0
+
+# file age histogram, controlled by -A, --cold and --cold-days
+# age_field is the os.stat() attribute used: st_mtime or st_atime, None when disabled
+# each directory's ages are a list of the bytes in each AGE_LABELS bucket, followed by the cold bytes
+AGE_BUCKET_DAYS = (30, 90, 365)
+AGE_LABELS = ("<30d", "30-90d", "90-365d", ">365d")
+AGE_SLOTS = len(AGE_LABELS) + 1
+age_field: Any = None
+cold_days = 90
+cold_percent: Any = None
+scan_day = 0
+
+# -l: (st_dev, st_ino) of every file with more than one hard link, packed into a single int
+# files with only one link can not be seen twice, so they are never added
+want_hardlinks = False
+all_links: set = set()
+all_links_lock = threading.Lock()
+
+# st_blocks is not available on Windows, where the allocated size is reported as the apparent size
+HAS_BLOCKS = hasattr(os.stat("."), "st_blocks")
+
+# module settings copied into each --processes worker by init_process_worker()
+PROCESS_SETTINGS = ("output_jsonl", "top_count", "age_field", "cold_days", "cold_percent", "scan_day", "want_cumulative")
+
+# when -o is invoked, rows are streamed to disk by this OutputWriter, -j selects JSON lines instead of CSV
+all_output: Any = None
+output_jsonl = False
+
+# when --progress is invoked, this ProgressReporter periodically publishes the running totals of every thread
+all_progress: Any = None
+
+# --snapshot file: a header line, a JSON line with the root and creation time, then one record per directory
+# sorted by relative path, each path is stored as the length of the prefix it shares with the previous path
+# followed by the remaining bytes; record: prefix length, suffix length, bytes, files, cumulative bytes, cumulative files
+SNAPSHOT_MAGIC = b"duu-snapshot 1\n"
+SNAPSHOT_RECORD = struct.Struct("<IIqqqq")
+
+#############################################################################
+
+class DirectoryTree:
+    """Compact parent-index representation of all scanned directories, used by -c (cumulative)
+        A directory is always added after its parent, so a single reverse sweep over the arrays
+        visits every child before its parent, which rolls up the totals without re-walking
+    """
+    __slots__ = ("names", "index", "parents", "depths", "totals", "files", "scanned", "ages", "lock", "rolled_up")
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.parents = array.array("q")
+        self.depths = array.array("l")
+        self.totals = array.array("q")
+        self.files = array.array("q")
+        self.scanned = bytearray()
+        # with -A, AGE_SLOTS entries per directory
+        self.ages = array.array("q")
+        self.lock = threading.Lock()
+        self.rolled_up = False
+
+    def add(self, path:str, parent_path:str=None) -> int:
+        """Registers a directory, parent_path must have been added beforehand (None for the root)
+
+        Returns:
+            The index of the new directory
+        """
+        with self.lock:
+            parent = -1 if parent_path is None else self.index[parent_path]
+            idx = len(self.names)
+            self.names.append(path)
+            self.index[path] = idx
+            self.parents.append(parent)
+            self.depths.append(0 if parent < 0 else self.depths[parent] + 1)
+            self.totals.append(0)
+            self.files.append(0)
+            self.scanned.append(0)
+            if age_field:
+                self.ages.extend([0] * AGE_SLOTS)
+        return idx
+
+    def set_totals(self, path:str, total:int, file_count:int, ages:List[int]=None) -> None:
+        """Saves the bytes, number of files (and with -A, bytes per age) found directly inside of path
+        """
+        idx = self.index[path]
+        self.totals[idx] = total
+        self.files[idx] = file_count
+        self.scanned[idx] = 1
+        if ages is not None:
+            self.ages[idx * AGE_SLOTS:(idx + 1) * AGE_SLOTS] = array.array("q", ages)
+
+    def get_ages(self, idx:int) -> Any:
+        """Returns the bytes per age of a directory, None unless -A is invoked
+        """
+        return list(self.ages[idx * AGE_SLOTS:(idx + 1) * AGE_SLOTS]) if self.ages else None
+
+    def __getstate__(self) -> Tuple:
+        return self.names, self.parents, self.depths, self.totals, self.files, self.scanned, self.ages
+
+    def __setstate__(self, state:Tuple) -> None:
+        self.names, self.parents, self.depths, self.totals, self.files, self.scanned, self.ages = state
+        self.index = {path: idx for idx, path in enumerate(self.names)}
+        self.lock = threading.Lock()
+        self.rolled_up = False
+
+    def graft(self, other:"DirectoryTree", parent_path:str) -> None:
+        """Appends all directories of other (returned by a --processes worker) below parent_path
+        """
+        with self.lock:
+            parent = self.index[parent_path]
+            offset = len(self.names)
+            for idx, path in enumerate(other.names):
+                other_parent = other.parents[idx]
+                new_parent = parent if other_parent < 0 else other_parent + offset
+                self.names.append(path)
+                self.index[path] = offset + idx
+                self.parents.append(new_parent)
+                self.depths.append(self.depths[new_parent] + 1)
+                self.totals.append(other.totals[idx])
+                self.files.append(other.files[idx])
+                self.scanned.append(other.scanned[idx])
+            self.ages.extend(other.ages)
+
+    def cumulative_totals(self) -> Tuple[Any, Any]:
+        """Returns copies of the totals and files arrays, rolled up like rollup() does, the tree itself is not changed
+        """
+        totals = array.array("q", self.totals)
+        files = array.array("q", self.files)
+        for idx in range(len(self.names) - 1, 0, -1):
+            parent = self.parents[idx]
+            if parent >= 0:
+                totals[parent] += totals[idx]
+                files[parent] += files[idx]
+        return totals, files
+
+    def rollup(self) -> None:
+        """Adds the totals of every directory into all of its ancestors, only the first call does anything
+        """
+        if self.rolled_up:
+            return
+        self.rolled_up = True
+        for idx in range(len(self.names) - 1, 0, -1):
+            parent = self.parents[idx]
+            if parent >= 0:
+                self.totals[parent] += self.totals[idx]
+                self.files[parent] += self.files[idx]
+                if self.ages:
+                    for j in range(AGE_SLOTS):
+                        self.ages[parent * AGE_SLOTS + j] += self.ages[idx * AGE_SLOTS + j]
+
+#############################################################################
+
+class FileSizeStats:
+    """Streaming file size statistics which can be merged, memory use does not depend on the number of files
+        mean, stdev: Welford's algorithm, merged with Chan's parallel formula
+        median, percentiles: log-bucket histogram, accurate to within 1% of the actual size
+        mode: Misra-Gries frequent item counters, exact when the mode occurs in more than 1/MODE_SLOTS of all files
+    """
+    __slots__ = ("count", "average", "m2", "buckets", "modes")
+
+    GAMMA = 1.02
+    LOG_GAMMA = math.log(GAMMA)
+    MODE_SLOTS = 64
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.average = 0.0
+        self.m2 = 0.0
+        self.buckets: Dict[int, int] = {}
+        self.modes: Dict[int, int] = {}
+
+    def add(self, size:int) -> None:
+        """Adds a single file size
+        """
+        self.count += 1
+        delta = size - self.average
+        self.average += delta / self.count
+        self.m2 += delta * (size - self.average)
+
+        # empty files get their own bucket, since log(0) is undefined
+        key = math.ceil(math.log(size) / self.LOG_GAMMA) if size > 0 else -1
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+        modes = self.modes
+        if size in modes:
+            modes[size] += 1
+        elif len(modes) < self.MODE_SLOTS:
+            modes[size] = 1
+        else:
+            for m in list(modes):
+                modes[m] -= 1
+                if not modes[m]:
+                    del modes[m]
+
+    def merge(self, other:"FileSizeStats") -> None:
+        """Adds all of the file sizes seen by other
+        """
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.average - self.average
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.average += delta * other.count / total
+        self.count = total
+
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+
+        modes = self.modes
+        for size, n in other.modes.items():
+            modes[size] = modes.get(size, 0) + n
+        if len(modes) > self.MODE_SLOTS:
+            cutoff = sorted(modes.values(), reverse=True)[self.MODE_SLOTS]
+            self.modes = {size: n - cutoff for size, n in modes.items() if n > cutoff}
+
+    def percentile(self, p:float) -> float:
+        """Returns the (approximate) file size below which p percent of all files fall
+        """
+        if not self.count:
+            raise statistics.StatisticsError("no file sizes")
+        rank = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                break
+        return 0.0 if key < 0 else 2 * self.GAMMA ** key / (self.GAMMA + 1)
+
+    def mean(self) -> float:
+        if not self.count:
+            raise statistics.StatisticsError("no file sizes")
+        return self.average
+
+    def median(self) -> float:
+        return self.percentile(50)
+
+    def mode(self) -> int:
+        if not self.modes:
+            raise statistics.StatisticsError("no file sizes")
+        return max(self.modes, key=self.modes.get)
+
+    def stdev(self) -> float:
+        if self.count < 2:
+            raise statistics.StatisticsError("stdev requires at least two file sizes")
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def dumps(self) -> str:
+        """Serializes to JSON, used by the --index file
+        """
+        return json.dumps((self.count, self.average, self.m2, list(self.buckets.items()), list(self.modes.items())))
+
+    @classmethod
+    def loads(cls, data:str) -> "FileSizeStats":
+        fs = cls()
+        fs.count, fs.average, fs.m2, buckets, modes = json.loads(data)
+        fs.buckets = dict(buckets)
+        fs.modes = dict(modes)
+        return fs
+
+#############################################################################
+
+class ScanTotals:
+    """Running totals owned by a single thread, so that the per-directory code never updates shared state
+    """
+    __slots__ = ("file_count", "err_count", "dir_count", "total_bytes", "exclude_count", "extensions", "csv_list", "file_stats", "index_reused", "index_rescans", "top_files", "top_dirs", "age_bytes", "allocated_bytes", "links_skipped", "thread_name", "busy_time", "current_dir", "current_start")
+
+    def __init__(self) -> None:
+        self.file_count = 0
+        self.err_count = 0
+        self.dir_count = 0
+        self.total_bytes = 0
+        self.exclude_count = 0
+        self.extensions: DefaultDict[str, int] = defaultdict(int)
+        self.csv_list: List[str] = []
+        self.file_stats = FileSizeStats()
+        self.index_reused = 0
+        self.index_rescans = 0
+        # min-heaps of (size, name) holding at most top_count entries
+        self.top_files: List[Tuple[int, str]] = []
+        self.top_dirs: List[Tuple[int, str]] = []
+        self.age_bytes = [0] * AGE_SLOTS
+        self.allocated_bytes = 0
+        self.links_skipped = 0
+        # read by the ProgressReporter while the scan is running
+        self.thread_name = ""
+        self.busy_time = 0.0
+        self.current_dir: Any = None
+        self.current_start = 0.0
+
+    def begin(self, dname:str) -> None:
+        """Marks the start of the work on a single directory
+        """
+        self.current_start = time.monotonic()
+        self.current_dir = dname
+
+    def end(self) -> None:
+        """Marks the end of the work started by begin()
+        """
+        self.current_dir = None
+        self.busy_time += time.monotonic() - self.current_start
+
+    def merge(self, other:"ScanTotals") -> None:
+        """Adds the totals of other, which must no longer be updated by its thread
+        """
+        self.file_count += other.file_count
+        self.err_count += other.err_count
+        self.dir_count += other.dir_count
+        self.total_bytes += other.total_bytes
+        self.exclude_count += other.exclude_count
+        for e, n in other.extensions.items():
+            self.extensions[e] += n
+        self.csv_list += other.csv_list
+        self.file_stats.merge(other.file_stats)
+        self.index_reused += other.index_reused
+        self.index_rescans += other.index_rescans
+        for size, name in other.top_files:
+            push_top(self.top_files, size, name)
+        for size, name in other.top_dirs:
+            push_top(self.top_dirs, size, name)
+        for j, n in enumerate(other.age_bytes):
+            self.age_bytes[j] += n
+        self.allocated_bytes += other.allocated_bytes
+        self.links_skipped += other.links_skipped
+        self.busy_time += other.busy_time
+
+#############################################################################
+
+def push_top(heap:List[Tuple[int, str]], size:int, name:str) -> None:
+    """Keeps the top_count largest (size, name) pairs in the min-heap: heap
+    """
+    if len(heap) < top_count:
+        heapq.heappush(heap, (size, name))
+    elif size > heap[0][0]:
+        heapq.heapreplace(heap, (size, name))
+
+#############################################################################
+
+def age_buckets(dir_days:Dict[int, int]) -> List[int]:
+    """Converts the bytes per day (days since the epoch) of a directory into bytes per AGE_LABELS bucket
+
+    Args:
+        dir_days: key=day of the file's mtime or atime, val=number of bytes
+
+    Returns:
+        The bytes in each AGE_LABELS bucket, followed by the number of bytes at least cold_days old
+    """
+    ages = [0] * AGE_SLOTS
+    for day, n in dir_days.items():
+        age = scan_day - day
+        ages[bisect.bisect_right(AGE_BUCKET_DAYS, age)] += n
+        if age >= cold_days:
+            ages[-1] += n
+    return ages
+
+#############################################################################
+
+def get_thread_totals() -> ScanTotals:
+    """Returns the ScanTotals owned by the current thread, creating it on first use
+    """
+    totals = getattr(thread_local, "totals", None)
+    if totals is None:
+        totals = thread_local.totals = ScanTotals()
+        totals.thread_name = threading.current_thread().name
+        all_totals.append(totals)
+    return totals
+
+#############################################################################
+
+def merge_scan_totals() -> ScanTotals:
+    """Combines the ScanTotals of every thread, call once all threads have finished
+
+    Returns:
+        The totals of the entire scan
+    """
+    combined = ScanTotals()
+    for totals in all_totals:
+        combined.merge(totals)
+    return combined
+
+#############################################################################
+
+class ScanIndex:
+    """Persistent SQLite index of the tallies of every directory, used by --index
+        A directory whose modification time is unchanged since the previous run is not listed
+        again, its subdirectories and totals are taken from the index instead
+    """
+    __slots__ = ("fname", "root", "entries", "updates")
+
+    def __init__(self, fname:str, root:str) -> None:
+        self.fname = fname
+        self.root = root
+        self.entries: Dict[str, Tuple] = {}
+        self.updates: Dict[str, Tuple] = {}
+
+        with closing(sqlite3.connect(fname)) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            if meta.get("version", INDEX_VERSION) != INDEX_VERSION:
+                db.execute("DROP TABLE IF EXISTS dirs")
+            db.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT, file_count INTEGER, err_count INTEGER, total_bytes INTEGER, extensions TEXT, file_stats TEXT, top_files TEXT, days TEXT, allocated INTEGER, links INTEGER)")
+            # an index built for a different starting directory is not reused
+            if meta.get("root") == root and meta.get("version") == INDEX_VERSION:
+                for entry in db.execute("SELECT * FROM dirs"):
+                    self.entries[entry[0]] = entry[1:]
+
+    def lookup(self, dname:str, mtime_ns:int, stats:bool) -> Any:
+        """Returns a walker tuple for get_disk_usage() built from the index, or None if dname needs to be rescanned
+        """
+        row = self.entries.get(dname)
+        if row is None or row[0] != mtime_ns or (stats and row[6] is None) or (top_count and len(json.loads(row[7])) < min(top_count,row[2])) or (age_field and (row[8] is None or json.loads(row[8])[0] != age_field)) or (want_hardlinks and row[10]):
+            get_thread_totals().index_rescans += 1
+            return None
+
+        get_thread_totals().index_reused += 1
+        self.updates[dname] = row
+
+        mtime, subdirs, file_count, err_count, total, extensions, file_stats, top_files, days, allocated, links = row
+        dir_file_stats = FileSizeStats.loads(file_stats) if stats else None
+        curr_exten_list: DefaultDict[str, int] = defaultdict(int, json.loads(extensions))
+        dir_top_files = [tuple(entry) for entry in json.loads(top_files)]
+        dir_days = dict(json.loads(days)[1]) if age_field else {}
+        return dname, json.loads(subdirs), [], None, (file_count, err_count, total, dir_file_stats, curr_exten_list, dir_top_files, dir_days, allocated, links, 0)
+
+    def update(self, walker:tuple, mtime_ns:int, stats:bool) -> None:
+        """Saves the tallies of a rescanned directory, these are written to disk by save()
+        """
+        dname, dirs = walker[:2]
+        file_count, err_count, total, dir_file_stats, curr_exten_list, dir_top_files, dir_days, allocated, links, links_skipped = walker[4]
+        if want_hardlinks and links:
+            # whether a hard link was counted here depends on the order of this run, so it is always rescanned
+            return
+        file_stats = dir_file_stats.dumps() if stats else None
+        days = json.dumps((age_field, list(dir_days.items()))) if age_field else None
+        self.updates[dname] = (mtime_ns, json.dumps(dirs), file_count, err_count, total, json.dumps(curr_exten_list), file_stats, json.dumps(dir_top_files), days, allocated, links)
+
+    def save(self) -> None:
+        """Replaces the contents of the index with the directories seen during this run
+        """
+        with closing(sqlite3.connect(self.fname)) as db, db:
+            db.execute("DELETE FROM dirs")
+            db.executemany("INSERT INTO dirs VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", ((path,) + row for path, row in self.updates.items()))
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('root',?)", (self.root,))
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('version',?)", (INDEX_VERSION,))
+
+#############################################################################
+
+class OutputWriter:
+    """Streams the -o rows to disk from a background thread while the scan is still running
+        The queue is bounded, so when the disk can not keep up the scanning threads wait instead of using more memory
+        After a write error the rows are discarded, so the scanning threads never wait on a queue nobody reads
+    """
+    __slots__ = ("fname", "fp", "rows", "thread", "error")
+
+    QUEUE_SIZE = 10000
+    BATCH_SIZE = 1000
+
+    def __init__(self, fname:str, encoding:str) -> None:
+        self.fname = fname
+        self.error: Any = None
+        self.fp = open(fname, mode="w", encoding=encoding, errors="replace")
+        self.rows: queue.Queue = queue.Queue(self.QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, row:str) -> None:
+        if self.error is None:
+            self.rows.put(row)
+
+    def run(self) -> None:
+        """Thread body, writes the waiting rows in batches until close() is called
+        """
+        done = False
+        while not done:
+            batch = [self.rows.get()]
+            while len(batch) < self.BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self.rows.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if batch and self.error is None:
+                try:
+                    self.fp.write("\n".join(batch))
+                    self.fp.write("\n")
+                    # so that a crash hours into the scan does not lose the rows written so far
+                    self.fp.flush()
+                except OSError as err:
+                    # keep draining the queue, close() reports the error
+                    self.error = err
+
+    def close(self) -> bool:
+        """Writes all remaining rows and closes the file
+
+        Returns:
+            False after a write error, which has been displayed
+        """
+        self.rows.put(None)
+        self.thread.join()
+        try:
+            self.fp.close()
+        except OSError as err:
+            if self.error is None:
+                self.error = err
+        if self.error is not None:
+            safe_print("", isError=True)
+            safe_print("Error: unable to write output file: %s (%s)" % (self.fname,self.error), isError=True)
+            safe_print("", isError=True)
+            return False
+        return True
+
+#############################################################################
+
+class ProgressReporter:
+    """Publishes the progress of the scan every interval seconds from a background thread, used by --progress
+        A one-line summary is sent to STDERR, the full report (including the directory each thread
+        is working on, and for how long) is written to a JSON status file and/or to the clients of
+        a Unix socket. A slow mount shows low rates on all threads, a stuck thread shows the same
+        directory with a growing dir_seconds.
+    """
+    __slots__ = ("interval", "fname", "socket_path", "server", "clients", "work_queue", "time_start", "previous", "stop_event", "thread")
+
+    def __init__(self, interval:float, fname:str=None, socket_path:str=None) -> None:
+        self.interval = interval
+        self.fname = fname
+        self.socket_path = socket_path
+        self.server: Any = None
+        self.clients: List[Any] = []
+        # set by the walk engine, its qsize() is the number of directories waiting to be tallied
+        self.work_queue: Any = None
+        self.time_start = time.monotonic()
+        self.previous = (self.time_start, 0, 0, 0)
+        self.stop_event = threading.Event()
+
+        if socket_path:
+            # only a socket left behind by an earlier run is removed
+            if os.path.lexists(socket_path):
+                if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                    raise FileExistsError("already exists and is not a socket: %s" % (socket_path))
+                os.unlink(socket_path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(socket_path)
+            self.server.listen()
+            self.server.setblocking(False)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """Thread body, publishes a report every interval seconds until close() is called
+        """
+        while not self.stop_event.wait(self.interval):
+            self.publish(self.report())
+
+    def report(self) -> Dict[str, Any]:
+        """Returns a snapshot of the running totals of every thread, which are read without locking
+        """
+        now = time.monotonic()
+        file_count = dir_count = total_bytes = 0
+        threads = []
+        for totals in list(all_totals):
+            file_count += totals.file_count
+            dir_count += totals.dir_count
+            total_bytes += totals.total_bytes
+            dname, start = totals.current_dir, totals.current_start
+            busy = totals.busy_time + (now - start if dname is not None else 0)
+            threads.append({"name": totals.thread_name, "busy": round(busy, 3), "dir": dname,
+                            "dir_seconds": round(now - start, 3) if dname is not None else None})
+
+        prev_time, prev_files, prev_dirs, prev_bytes = self.previous
+        self.previous = (now, file_count, dir_count, total_bytes)
+        seconds = max(now - prev_time, 0.001)
+
+        return {"elapsed": round(now - self.time_start, 3), "files": file_count, "dirs": dir_count, "bytes": total_bytes,
+                "files_per_sec": round((file_count - prev_files) / seconds, 1), "dirs_per_sec": round((dir_count - prev_dirs) / seconds, 1),
+                "bytes_per_sec": round((total_bytes - prev_bytes) / seconds), "queue": self.work_queue.qsize() if self.work_queue is not None else 0,
+                "threads": threads}
+
+    def publish(self, report:Dict[str, Any]) -> None:
+        """Sends a report to STDERR, the status file and the socket clients
+        """
+        line = "progress: %s files %s (%s/s) dirs %s (%s/s) bytes %s queue %s" % (timedelta(seconds=int(report["elapsed"])), fmt(report["files"],0),
+                fmt(report["files_per_sec"],0), fmt(report["dirs"],0), fmt(report["dirs_per_sec"],0), fmt(report["bytes"],0), fmt(report["queue"],0))
+        working = [t for t in report["threads"] if t["dir"] is not None]
+        line += " busy %d/%d" % (len(working), len(report["threads"]))
+        if working:
+            slowest = max(working, key=lambda t: t["dir_seconds"])
+            if slowest["dir_seconds"] >= self.interval:
+                line += " longest: %s (%ds)" % (slowest["dir"], slowest["dir_seconds"])
+        safe_print(line, isError=True)
+
+        data = json.dumps(report)
+        if self.fname:
+            # replaced in a single step, so a reader never sees a partially written file
+            try:
+                with open(self.fname + ".tmp", mode="w", encoding="utf-8") as fp:
+                    fp.write(data + "\n")
+                os.replace(self.fname + ".tmp", self.fname)
+            except OSError as err:
+                safe_print("Error: unable to write progress file: %s (%s)" % (self.fname,err), isError=True)
+
+        if self.server is not None:
+            while True:
+                try:
+                    client = self.server.accept()[0]
+                except OSError:
+                    break
+                # a client that stops reading must not block this thread
+                client.setblocking(False)
+                self.clients.append(client)
+            for client in list(self.clients):
+                try:
+                    client.sendall((data + "\n").encode("utf-8"))
+                except OSError:
+                    # the client disconnected, or its buffer is full (BlockingIOError)
+                    client.close()
+                    self.clients.remove(client)
+
+    def close(self) -> None:
+        """Stops the thread and publishes the final report, only the first call does anything
+        """
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        self.thread.join()
+        # the scan is done, the executor's queue only holds its shutdown markers
+        self.work_queue = None
+        self.publish(self.report())
+        if self.server is not None:
+            for client in self.clients:
+                client.close()
+            self.server.close()
+            os.unlink(self.socket_path)
+
+#############################################################################
+
+def write_output_row(row:str) -> None:
+    """Sends a -o row to all_output, or to the ScanTotals of the current thread inside of a --processes worker
+    """
+    if all_output is not None:
+        all_output.write(row)
+    else:
+        get_thread_totals().csv_list.append(row)
 
 #############################################################################
 
@@ -60,7 +775,8 @@ def safe_print(data:str,isError:bool=False) -> None:
 
     dest = sys.stdout if not isError else sys.stderr
     # can also use 'replace' instead of 'ignore' for errors= parameter
-    print( str(data).encode(sys.stdout.encoding, errors='ignore').decode(sys.stdout.encoding), file=dest )
+    # a single write() keeps the line intact when --processes workers share STDOUT
+    dest.write( "%s\n" % (str(data).encode(sys.stdout.encoding, errors='ignore').decode(sys.stdout.encoding)) )
 
 #############################################################################
 
@@ -86,9 +802,11 @@ def fmt(n:float,precision:int=2,no_comma:bool=False) -> str:
 
 #############################################################################
 
-def display_threaded_extensions() -> int:
-    """Iterates through all_extensions to find the extension with the longest length: longest
-        also combines all sublists of all_extensions into one large list: combined
+def display_threaded_extensions(totals:ScanTotals) -> int:
+    """Finds the extension with the longest length: longest, then outputs all extensions
+
+    Args:
+        totals: the combined totals of all threads
 
     Returns:
         The number of unique extensions
@@ -96,17 +814,14 @@ def display_threaded_extensions() -> int:
 
     longest = ""
     longest_len = 0
-    combined: DefaultDict[str, int] = defaultdict(int)
-    for key in all_extensions:
-        for val in all_extensions[key]:
-            combined[val] += all_extensions[key][val]
-            if len(val) > longest_len:
-                longest = val
-                longest_len = len(val)
+    for val in totals.extensions:
+        if len(val) > longest_len:
+            longest = val
+            longest_len = len(val)
 
-    display_extentions(longest,combined)
+    display_extentions(longest,totals.extensions)
 
-    return len(combined)
+    return len(totals.extensions)
 
 #############################################################################
 
@@ -132,38 +847,74 @@ def display_extentions(longest_ext:str,extensions:dict) -> None:
 
 #############################################################################
 
-def display_threaded_summary(unique_ext_count:int=0) -> Tuple[int, int]:
-    """Sums the counts for each entry in all_stats: file,error,directory,total_bytes
-        (all_stats includes these stats for each individual directory)
+def display_top(totals:ScanTotals,human:bool) -> None:
+    """Outputs the largest files and directories, largest first
+        (the size of a directory only includes the files directly inside of it, unless -c is invoked)
 
     Args:
-        unique_ext_count: total number of unique file extensions
+        totals: the combined totals of all threads
+
+        human: true if cmd-line -H is invoked
 
     Returns:
-        The total number of files seen, total number of directories seen
+        None
     """
-    file_count = 0
-    err_count = 0
-    dir_count = 0
-    total_bytes = 0
-    stats_file_sizes: List[int] = []
+    top_dirs = totals.top_dirs
+    if want_cumulative:
+        # rank by the same cumulative totals that -c displays (all_tree is also built for --snapshot alone)
+        all_tree.rollup()
+        top_dirs = heapq.nlargest(top_count, ((all_tree.totals[idx], name) for idx, name in enumerate(all_tree.names) if all_tree.scanned[idx]))
+
+    for title, heap in (("largest files", totals.top_files), ("largest directories", top_dirs)):
+        print()
+        print(title)
+        print("=" * len(title))
+        for size, name in sorted(heap, reverse=True):
+            safe_print("%s\t%s" % (convert_size(size) if human else fmt(size,0), name))
+
+#############################################################################
 
-    for entry in all_stats.keys():
-        file_count += all_stats[entry][0]
-        err_count += all_stats[entry][1]
-        dir_count += all_stats[entry][2]
-        total_bytes += all_stats[entry][3]
-        if all_stats[entry][4]:
-            stats_file_sizes += all_stats[entry][5]
+def display_ages(totals:ScanTotals) -> None:
+    """Outputs the number of bytes in each file age bucket, see -A
 
-    stats = False if not len(stats_file_sizes) else True
-    display_summary(file_count,err_count,dir_count,total_bytes,stats,stats_file_sizes,unique_ext_count)
+    Args:
+        totals: the combined totals of all threads
 
-    return file_count, dir_count
+    Returns:
+        None
+    """
+    title = "file age by %s (in bytes)" % (age_field[3:])
+    print()
+    print(title)
+    print("=" * len(title))
+    labels = AGE_LABELS + (">=%dd (cold)" % (cold_days),)
+    for label, n in zip(labels, totals.age_bytes):
+        percent = 100.0 * n / totals.total_bytes if totals.total_bytes else 0
+        print("%-14s: %s (%s%%)" % (label, fmt(n,0), fmt(percent,2)))
 
 #############################################################################
 
-def display_summary(file_count:int,err_count:int,dir_count:int,total_bytes:int,stats:bool,stats_file_sizes:list,unique_ext_count:int) -> None:
+def display_threaded_summary(totals:ScanTotals,unique_ext_count:int=0,percentiles:bool=False) -> Tuple[int, int]:
+    """Outputs the summary for the combined totals of all threads: file,error,directory,total_bytes
+
+    Args:
+        totals: the combined totals of all threads
+
+        unique_ext_count: total number of unique file extensions
+
+        percentiles: true if cmd-line -P is invoked
+
+    Returns:
+        The total number of files seen, total number of directories seen
+    """
+    stats = False if not totals.file_stats.count else True
+    display_summary(totals.file_count,totals.err_count,totals.dir_count,totals.total_bytes,stats,totals.file_stats,unique_ext_count,percentiles,totals)
+
+    return totals.file_count, totals.dir_count
+
+#############################################################################
+
+def display_summary(file_count:int,err_count:int,dir_count:int,total_bytes:int,stats:bool,file_stats:FileSizeStats,unique_ext_count:int,percentiles:bool=False,totals:ScanTotals=None) -> None:
     """Outputs the total number of files, directories as well as file sizes
 
     Args:
@@ -171,10 +922,14 @@ def display_summary(file_count:int,err_count:int,dir_count:int,total_bytes:int,s
 
         stats: true if -S cmd-line parameter is invoked
 
-        stats_file_sizes: list of every file size
+        file_stats: statistics of every file size
 
         unique_ext_count: count of unique file extensions
 
+        percentiles: true if -P cmd-line parameter is invoked
+
+        totals: the combined totals of all threads, for exclusion and --index counts
+
     Returns:
         None
     """
@@ -187,8 +942,8 @@ def display_summary(file_count:int,err_count:int,dir_count:int,total_bytes:int,s
     if err_count:
         percent = err_count / (err_count+file_count)
         print("read errors   : %s (%s%%)" % ( err_count, fmt(percent,2) ))
-    if all_exclude_count:
-        print("exclusions    : %s" % (fmt(all_exclude_count,0)))
+    if totals and totals.exclude_count:
+        print("exclusions    : %s" % (fmt(totals.exclude_count,0)))
 
     print("bytes         : %s" % ( fmt(total_bytes,0) ))
     # comparison values are about 90.909% of kilo,mega,giga, and terabyte
@@ -204,10 +959,16 @@ def display_summary(file_count:int,err_count:int,dir_count:int,total_bytes:int,s
         print("petabytes     : %s" % ( fmt(total_bytes / 1024.0 ** 5)))
     if unique_ext_count:
         print("unique extens : %s" % (fmt(unique_ext_count,0)))
+    if totals and want_hardlinks:
+        print("allocated     : %s" % (fmt(totals.allocated_bytes,0)))
+        print("links skipped : %s" % (fmt(totals.links_skipped,0)))
+    if totals and all_index is not None:
+        print("index reused  : %s" % (fmt(totals.index_reused,0)))
+        print("index rescans : %s" % (fmt(totals.index_rescans,0)))
     
     # if cmd-line includes -S
-    if stats and len(stats_file_sizes):
-        display_file_stats(stats_file_sizes)
+    if stats and file_stats.count:
+        display_file_stats(file_stats,percentiles)
 
 #############################################################################
 
@@ -243,11 +1004,13 @@ def convert_size(n:int) -> str:
 
 #############################################################################
 
-def display_file_stats(stats_file_sizes:list) -> None:
+def display_file_stats(file_stats:FileSizeStats,percentiles:bool=False) -> None:
     """Outputs mathematical statistics for all files
     
     Args:
-        stats_file_sizes: list of every file size
+        file_stats: statistics of every file size
+
+        percentiles: also output the 50th, 90th and 99th percentiles
 
     Returns:
         None
@@ -257,36 +1020,40 @@ def display_file_stats(stats_file_sizes:list) -> None:
     print("=" * 26)
 
     try:
-        mean = statistics.mean(stats_file_sizes)
+        mean = file_stats.mean()
     except:
         print("mean          : N/A")
     else:
         print("mean          : %s" % fmt(mean,0))
 
     try:
-        median = statistics.median(stats_file_sizes)
+        median = file_stats.median()
     except:
         print("median        : N/A")
     else:
         print("median        : %s" % fmt(median,0))
 
     try:
-        mode = statistics.mode(stats_file_sizes)
+        mode = file_stats.mode()
     except:
         print("mode          : N/A")
     else:
         print("mode          : %s" % fmt(mode,0))
 
     try:
-        stdev = statistics.stdev(stats_file_sizes)
+        stdev = file_stats.stdev()
     except:
         print("stdev         : N/A")
     else:
         print("stdev         : %s" % fmt(stdev,0))
 
+    if percentiles:
+        for p in (50, 90, 99):
+            print("p%-2d           : %s" % (p, fmt(file_stats.percentile(p),0)))
+
 #############################################################################
 
-def display_runtime_statistics(time_start:float, time_end:float, file_count:int, dir_count:int, threads:int) -> None:
+def display_runtime_statistics(time_start:float, time_end:float, file_count:int, dir_count:int, threads:int, engine:str="os.walk", busy_time:float=0.0) -> None:
     """Outputs information about how long the pgm ran for
 
     Args:
@@ -296,6 +1063,10 @@ def display_runtime_statistics(time_start:float, time_end:float, file_count:int,
 
         threads: number of threads used
 
+        engine: the directory walker that was used, either os.walk or scandir (-W)
+
+        busy_time: the seconds the threads spent working on directories, added together
+
     Returns:
         None
     """
@@ -306,12 +1077,15 @@ def display_runtime_statistics(time_start:float, time_end:float, file_count:int,
     print("elapsed time  : %s" % (time_elapsed))
     print("files per sec : %s" % (fmt(fcount_per_sec)))
     print("dirs per sec  : %s" % (fmt(dcount_per_sec)))
+    print("walk engine   : %s" % (engine))
     if threads > 1:
         print("thread count  : %d" % (threads))
+    if busy_time:
+        print("threads busy  : %s%%" % (fmt(100 * busy_time / (threads * ((time_end+0.001) - time_start)),1)))
 
 #############################################################################
 
-def get_disk_threaded_usage(root_dir:str=".",ext:bool=False,verbose:bool=True,status:bool=False,skipdot:bool=False,stats:bool=False,bare:bool=False,norecurse:bool=False,verbose_files:bool=False,human:bool=False,max_workers:int=1,exclude:str=None,regexpr:str=None,csv_output:bool=False,stats_update:int=100) -> None:
+def get_disk_threaded_usage(root_dir:str=".",ext:bool=False,verbose:bool=True,status:bool=False,skipdot:bool=False,stats:bool=False,bare:bool=False,norecurse:bool=False,verbose_files:bool=False,human:bool=False,max_workers:int=1,exclude:str=None,regexpr:str=None,csv_output:bool=False,stats_update:int=100,scandir:bool=False,processes:int=0) -> None:
     """Initiates the multithreading directory scans using up to max_worker number of threads
         Unless -N (norecurse), the scans recursively visit each directory in root_dir
 
@@ -346,34 +1120,286 @@ def get_disk_threaded_usage(root_dir:str=".",ext:bool=False,verbose:bool=True,st
 
         stats_update: display stats every N number of directories
 
+        scandir: true if cmd-line -W is invoked
+
+        processes: number of processes passed to cmd-line --processes, 0 to only use threads
+
     Returns:
         None
     """
+    if all_tree is not None:
+        all_tree.add(root_dir)
+
     if norecurse:
         walker = os.walk(root_dir)
         first = next(walker)
         get_disk_usage(first,ext,verbose,status,skipdot,stats,bare,norecurse,verbose_files,True,1,exclude,regexpr,csv_output,stats_update)
+    elif processes:
+        get_disk_process_usage(root_dir,processes,scandir,(ext,verbose,status,skipdot,stats,bare,norecurse,verbose_files,human,max_workers,exclude,regexpr,csv_output,stats_update))
+    elif scandir:
+        get_disk_scandir_usage(root_dir,max_workers,(ext,verbose,status,skipdot,stats,bare,norecurse,verbose_files,human,max_workers,exclude,regexpr,csv_output,stats_update))
     else:
         with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
-            {executor.submit(get_disk_usage,walker,ext,verbose,status,skipdot,stats,bare,norecurse,verbose_files,human,max_workers,exclude,regexpr,csv_output,stats_update): walker for walker in os.walk(root_dir)}
+            if all_progress is not None:
+                # the executor has no public way to get the number of waiting tasks
+                all_progress.work_queue = executor._work_queue
+            for walker in os.walk(root_dir):
+                if all_tree is not None:
+                    # register subdirectories before any worker can get to them
+                    for subdir in walker[1]:
+                        all_tree.add(join(walker[0],subdir),walker[0])
+                executor.submit(get_timed_disk_usage,walker,ext,verbose,status,skipdot,stats,bare,norecurse,verbose_files,human,max_workers,exclude,regexpr,csv_output,stats_update)
+
+#############################################################################
+
+def get_disk_process_usage(root_dir:str,processes:int,scandir:bool,usage_args:tuple) -> None:
+    """Partitions the scan by the top-level subdirectories of root_dir, each one is scanned by
+        one of the worker processes, which return their ScanTotals (and DirectoryTree for -c)
+        root_dir itself is tallied by this process
+
+    Args:
+        root_dir: starting directory
+
+        processes: number of processes passed to cmd-line --processes
+
+        scandir: true if cmd-line -W is invoked
+
+        usage_args: the remaining get_disk_usage() arguments, passed through as-is
+
+    Returns:
+        None
+    """
+    walker = scan_directory(root_dir)
+    get_disk_usage(walker,*usage_args)
+    subdirs = [join(root_dir,subdir) for subdir in walker[1]]
+
+    # usage_args[11] is the -X colon-separated list, which has to be compiled again by each process
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=init_process_worker, initargs=(usage_args[11],{name: globals()[name] for name in PROCESS_SETTINGS})) as executor:
+        futures = [executor.submit(get_disk_subtree_usage,subdir,scandir,all_tree is not None,usage_args) for subdir in subdirs]
+        for future in futures:
+            totals, tree = future.result()
+            # the workers can not reach all_output, their -o rows are returned in csv_list instead
+            if all_output is not None:
+                for row in totals.csv_list:
+                    all_output.write(row)
+                totals.csv_list = []
+            # merged along with the totals of this process by merge_scan_totals()
+            all_totals.append(totals)
+            if tree is not None:
+                all_tree.graft(tree,root_dir)
+
+#############################################################################
+
+def init_process_worker(regexpr:str,settings:Dict[str, Any]) -> None:
+    """Runs once in each --processes worker
+
+    Args:
+        regexpr: the -X colon-separated list of regular expressions
+
+        settings: the values of the PROCESS_SETTINGS module variables in the parent process
+
+    Returns:
+        None
+    """
+    global all_regexpr_excludes, all_output
+
+    globals().update(settings)
+    all_output = None
+    all_regexpr_excludes = []
+    build_regexpr_excludes(regexpr)
+
+    # each line is written to the shared STDOUT with a single write, so lines from different processes do not get mixed
+    sys.stdout.reconfigure(line_buffering=True)
+
+#############################################################################
+
+def get_disk_subtree_usage(root_dir:str,scandir:bool,cumulative:bool,usage_args:tuple) -> Tuple[ScanTotals, Any]:
+    """Runs in a --processes worker: scans root_dir and all of its subdirectories using -T threads
+
+    Args:
+        root_dir: a top-level subdirectory of the starting directory
+
+        scandir: true if cmd-line -W is invoked
+
+        cumulative: true if -c, -d or --snapshot is invoked
+
+        usage_args: see get_disk_process_usage()
+
+    Returns:
+        The combined totals of root_dir, and its DirectoryTree (None unless cumulative)
+    """
+    global all_totals, thread_local, all_tree
+
+    # a worker process scans many subdirectories, start each one with empty totals
+    all_totals = []
+    thread_local = threading.local()
+    all_tree = DirectoryTree() if cumulative else None
+
+    get_disk_threaded_usage(root_dir,*usage_args,scandir)
+
+    return merge_scan_totals(), all_tree
 
 #############################################################################
 
-def get_disk_usage(walker:tuple,ext:bool=False,verbose:bool=True,status:bool=False,skipdot:bool=False,stats:bool=False,bare:bool=False,norecurse:bool=False,verbose_files:bool=False,human:bool=False,max_workers:int=1,exclude:str=None,regexpr:str=None,csv_output:bool=False,stats_update:int=100) -> None:
+def get_disk_scandir_usage(root_dir:str,max_workers:int,usage_args:tuple) -> None:
+    """Work-stealing recursive scan: every thread pulls a directory from a shared queue,
+        enumerates it with os.scandir, pushes its subdirectories back onto the queue and
+        then tallies the directory with get_disk_usage()
+
+    Args:
+        root_dir: starting directory
+
+        max_workers: number of threads passed to cmd-line -T
+
+        usage_args: the remaining get_disk_usage() arguments, passed through as-is
+
+    Returns:
+        None
+    """
+    work_queue: queue.Queue = queue.Queue()
+    work_queue.put(root_dir)
+    if all_progress is not None:
+        all_progress.work_queue = work_queue
+
+    workers = [threading.Thread(target=scandir_worker, args=(work_queue,usage_args), daemon=True) for i in range(max_workers)]
+    for t in workers:
+        t.start()
+
+    # wait until every queued directory, including those discovered along the way, has been tallied
+    work_queue.join()
+
+    for t in workers:
+        work_queue.put(None)
+    for t in workers:
+        t.join()
+
+#############################################################################
+
+def scandir_worker(work_queue:queue.Queue,usage_args:tuple) -> None:
+    """Thread body for get_disk_scandir_usage(), a None entry on the queue stops the thread
+
+    Args:
+        work_queue: shared queue of directory names still waiting to be scanned
+
+        usage_args: see get_disk_scandir_usage()
+
+    Returns:
+        None
+    """
+    while True:
+        dname = work_queue.get()
+        if dname is None:
+            work_queue.task_done()
+            return
+        totals = get_thread_totals()
+        totals.begin(dname)
+        try:
+            if all_index is not None:
+                # usage_args[4] is the -S flag, which needs the individual file sizes
+                mtime_ns = os.stat(dname).st_mtime_ns
+                walker = all_index.lookup(dname,mtime_ns,usage_args[4])
+                if walker is None:
+                    walker = scan_directory(dname)
+                    walker += (tally_directory(dname,walker[2],walker[3],True,usage_args[4]),)
+                    all_index.update(walker,mtime_ns,usage_args[4])
+            else:
+                walker = scan_directory(dname)
+        except OSError:
+            # os.walk() also silently skips directories that can not be listed
+            totals.end()
+            work_queue.task_done()
+            continue
+
+        try:
+            for subdir in walker[1]:
+                if all_tree is not None:
+                    all_tree.add(join(dname,subdir),dname)
+                work_queue.put(join(dname,subdir))
+            get_disk_usage(walker,*usage_args)
+        except Exception as err:
+            safe_print("Error: unable to process: %s (%s)" % (dname,err), isError=True)
+        finally:
+            totals.end()
+            work_queue.task_done()
+
+#############################################################################
+
+def scan_directory(dname:str) -> Tuple[str, List[str], List[str], List[Any]]:
+    """Lists a single directory with os.scandir, keeping the DirEntry.stat() result of each file
+
+    On Windows, DirEntry.stat() leaves st_nlink, st_ino and st_dev as 0, so with -l the files are read with os.stat() instead
+
+    Args:
+        dname: the directory to list
+
+    Returns:
+        A tuple similar to the ones generated by os.walk(): (root, dirs, files, stat_results)
+        dirs excludes symbolic links since, like os.walk(), these are never followed
+        stat_results[i] is the os.stat_result of files[i], or None if it could not be read
+    """
+    dirs = []
+    files = []
+    stat_results: List[Any] = []
+    with os.scandir(dname) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    dirs.append(entry.name)
+                continue
+
+            files.append(entry.name)
+            try:
+                stat_results.append(os.stat(entry.path) if want_hardlinks and "nt" == os.name else entry.stat())
+            except OSError:
+                stat_results.append(None)
+
+    return dname, dirs, files, stat_results
+
+#############################################################################
+
+def get_timed_disk_usage(walker:tuple,*usage_args) -> None:
+    """Runs get_disk_usage() in an os.walk worker thread, recording the directory being worked on for --progress
+
+    Args:
+        walker: a tuple generated by os.walk()
+
+        usage_args: the remaining get_disk_usage() arguments, passed through as-is
+
+    Returns:
+        None
+    """
+    totals = get_thread_totals()
+    totals.begin(walker[0])
+    try:
+        get_disk_usage(walker,*usage_args)
+    finally:
+        totals.end()
+
+#############################################################################
+
+def get_disk_usage(walker:tuple,ext:bool=False,verbose:bool=True,status:bool=False,skipdot:bool=False,stats:bool=False,bare:bool=False,norecurse:bool=False,verbose_files:bool=False,human:bool=False,max_workers:int=1,exclude:str=None,regexpr:str=None,csv_output:bool=False,stats_update:int=100) -> Optional[Tuple[int, int, int, Any, DefaultDict[str, int], List[Tuple[int, str]], Dict[int, int], int, int, int]]:
     """Processes a single directory, compiling stats such a file count, file size, extensions, etc.
-        This information is placed into: all_stats, all_extensions, all_dir_count
+        This information is added to the ScanTotals of the current thread
 
     Args:
-        walker: a single tuple generated from os.walk()
+        walker: a single tuple generated from os.walk(), or from scan_directory() which
+                also includes the os.stat() results, so that they do not need to be read again
+                scandir_worker() may append a 5th item: the tallies from tally_directory()
 
         remaining args: see get_disk_threaded_usage()
 
     Returns:
-        None
+        The tallies of the directory, the same tuple as tally_directory(),
+        or None if the directory was skipped (-n) or excluded (-x, -X)
     """
-    global all_stats, all_extensions, all_dir_count, all_exclude_count, all_csv_list, all_regexpr_excludes
+    totals = get_thread_totals()
 
-    root, dirs, files = walker
+    root, dirs, files = walker[:3]
+    stat_results = walker[3] if len(walker) > 3 else None
     if skipdot and os.sep + "." in root:
         # skip directories beginning with a '.'
         return
@@ -386,7 +1412,7 @@ def get_disk_usage(walker:tuple,ext:bool=False,verbose:bool=True,status:bool=Fal
                 if not len(entry):
                     continue
                 if status and not bare: safe_print("excluding-STR: %s" % (root), True)
-                all_exclude_count += 1
+                totals.exclude_count += 1
                 return
 
     if regexpr:
@@ -395,63 +1421,477 @@ def get_disk_usage(walker:tuple,ext:bool=False,verbose:bool=True,status:bool=Fal
             result = entry.search(root)
             if result:
                 if status and not bare: safe_print("excluding-REG: %s" % (root), True)
-                all_exclude_count += 1
+                totals.exclude_count += 1
                 return
 
+    if len(walker) > 4:
+        # already tallied by scandir_worker(), possibly reused from the --index file
+        tallies = walker[4]
+    else:
+        tallies = tally_directory(root,files,stat_results,ext,stats)
+    file_count, err_count, dir_total, dir_file_stats, curr_exten_list, dir_top_files, dir_days, allocated, links, links_skipped = tallies
+    ages = age_buckets(dir_days) if age_field else None
+    totals.file_count += file_count
+    totals.err_count += err_count
+    totals.dir_count += 1
+    totals.total_bytes += dir_total
+    totals.allocated_bytes += allocated
+    totals.links_skipped += links_skipped
+
+    if all_tree is not None:
+        # rolled up once the totals of all subdirectories are known
+        all_tree.set_totals(root, dir_total, file_count + err_count, ages)
+    if not want_cumulative:
+        display_directory(dir_total,file_count + err_count,root,verbose,verbose_files,human,bare,csv_output,ages)
+
+    if status:
+        dir_number = next(all_dir_counter)
+        if not (dir_number % stats_update):
+            print("Directories processed:", dir_number,file=sys.stderr)
+
+    if stats:
+        totals.file_stats.merge(dir_file_stats)
+    if ext:
+        for e, n in curr_exten_list.items():
+            totals.extensions[e] += n
+    if top_count:
+        for size, name in dir_top_files:
+            push_top(totals.top_files, size, name)
+        push_top(totals.top_dirs, dir_total, root)
+    if ages is not None:
+        for j, n in enumerate(ages):
+            totals.age_bytes[j] += n
+
+    return tallies
+
+#############################################################################
+
+def tally_directory(root:str,files:List[str],stat_results:List[Any],ext:bool,stats:bool) -> Tuple[int, int, int, Any, DefaultDict[str, int], List[Tuple[int, str]], Dict[int, int], int, int, int]:
+    """Counts the files, read errors, bytes and file extensions of a single directory
+
+    Args:
+        root: the directory name
+
+        files: the file names in root
+
+        stat_results: the os.stat() results from scan_directory(), or None to read them here
+
+        ext: true if cmd-line -e is invoked
+
+        stats: true if cmd-line -S is invoked
+
+    Returns:
+        A tuple of: file count, error count, total bytes, FileSizeStats (only with -S), extension counts (only with -e),
+        min-heap of the largest (size, file name) pairs (only with --top), bytes per day of age_field (only with -A),
+        allocated bytes, number of files with more than one hard link, number of those skipped as already counted (only with -l)
+    """
     curr_exten_list: DefaultDict[str, int] = defaultdict(int)
-    longest_ext = ""
-    total = 0
-    dir_total = 0
     file_count = 0
-    dir_count = 0
     err_count = 0
-    stats_file_sizes = []
+    dir_file_stats = FileSizeStats() if stats else None
+    dir_top_files: List[Tuple[int, str]] = []
+    dir_days: Dict[int, int] = {}
+    allocated = 0
+    links = 0
+    links_skipped = 0
 
-    dir_total = 0
-    dir_count += 1
-    all_dir_count += 1
     current = 0
-    for name in files:
+    for i, name in enumerate(files):
         if ext:
             # keep track of file extentions when -e is invoked
             tmp = os.path.splitext(name)[1][1:].lower()
             curr_exten_list[tmp] += 1
         fullname = join(root,name)
         try:
-            current += getsize(fullname)
+            if stat_results is None:
+                st = os.stat(fullname)
+            elif stat_results[i] is None:
+                raise OSError(fullname)
+            else:
+                st = stat_results[i]
+            if st.st_nlink > 1:
+                links += 1
+                if want_hardlinks:
+                    key = (st.st_dev << 64) | st.st_ino
+                    with all_links_lock:
+                        seen = key in all_links
+                        all_links.add(key)
+                    if seen:
+                        links_skipped += 1
+                        continue
+            size = st.st_size
+            current += size
+            allocated += st.st_blocks * 512 if HAS_BLOCKS else size
             if stats:
-                stats_file_sizes.append(current)
+                dir_file_stats.add(size)
+            if top_count:
+                push_top(dir_top_files, size, fullname)
+            if age_field:
+                day = int(getattr(st, age_field) // 86400)
+                dir_days[day] = dir_days.get(day, 0) + size
             file_count += 1
         except:
             safe_print("Error: unable to read: %s" % fullname, isError=True)
             err_count += 1
-    total += current
-    dir_total += current
-    
-    if human:
-        if verbose: safe_print("%s\t%s" % (convert_size(dir_total), root))
-        elif verbose_files: safe_print("%s\t%s\t%s" % (convert_size(dir_total), convert_size(len(files)), root))
 
-        if csv_output and verbose_files:
-            all_csv_list.append('"%s","%s","%s"' % (convert_size(dir_total), convert_size(len(files)), root))
-        elif csv_output:
-            all_csv_list.append('"%s","%s"' % (convert_size(dir_total), root))
+    return file_count, err_count, current, dir_file_stats, curr_exten_list, dir_top_files, dir_days, allocated, links, links_skipped
+
+#############################################################################
+
+def display_directory(dir_total:int,file_count:int,root:str,verbose:bool,verbose_files:bool,human:bool,bare:bool,csv_output:bool,ages:List[int]=None) -> None:
+    """Outputs the size (and optionally the number of files) of a single directory,
+        also writes the same information with write_output_row() when -o is invoked
+
+    Args:
+        dir_total: number of bytes in the directory
+
+        file_count: number of files in the directory
+
+        root: the directory name
+
+        remaining args: see get_disk_threaded_usage()
+
+        ages: with -A, the bytes in each AGE_LABELS bucket followed by the cold bytes, see age_buckets()
+
+    Returns:
+        None
+    """
+    if cold_percent is not None and ages is not None:
+        # --cold: only output directories whose data is mostly cold
+        if not dir_total or 100.0 * ages[-1] / dir_total < cold_percent:
+            return
+
+    if human:
+        size = convert_size(dir_total)
+        count = convert_size(file_count)
     else: # not human-readable
         # display directory size in kilobytes, when using 'bare' do not include commas
-        if verbose: safe_print("%s\t%s" % (fmt(round(dir_total/1024.0,0),0,bare), root))
-        elif verbose_files: safe_print("%s\t%s\t%s" % (fmt(round(dir_total/1024.0,0),0,bare), fmt(len(files),0), root))
+        size = fmt(round(dir_total/1024.0,0),0,bare)
+        count = fmt(file_count,0)
 
-        if csv_output and verbose_files:
-            all_csv_list.append('"%s","%s","%s"' % (fmt(round(dir_total/1024.0,0),0,bare), fmt(len(files),0), root))
-        elif csv_output:
-            all_csv_list.append('"%s","%s"' % (fmt(round(dir_total/1024.0,0),0,bare), root))
+    columns = [size, count] if verbose_files else [size]
+    if ages is not None:
+        columns += [convert_size(n) if human else fmt(round(n/1024.0,0),0,bare) for n in ages[:-1]]
+    columns.append(root)
 
-    if status and not (all_dir_count % stats_update):
-        print("Directories processed:", all_dir_count,file=sys.stderr)
+    if verbose or verbose_files: safe_print("\t".join(columns))
 
-    all_stats[walker[0]] = (file_count,err_count,dir_count,total,stats,stats_file_sizes)
-    if ext:
-        all_extensions[walker[0]] = curr_exten_list
+    if csv_output and output_jsonl:
+        try:
+            mtime = int(os.stat(root).st_mtime)
+        except OSError:
+            mtime = None
+        row = {"path": root, "bytes": dir_total, "files": file_count, "mtime": mtime}
+        if ages is not None:
+            row["age"] = dict(zip(AGE_LABELS, ages))
+            row["cold"] = ages[-1]
+        write_output_row(json.dumps(row))
+    elif csv_output:
+        write_output_row(",".join('"%s"' % (c) for c in columns))
+
+#############################################################################
+
+def display_cumulative(max_depth:int,verbose:bool,verbose_files:bool,human:bool,bare:bool,csv_output:bool) -> None:
+    """Rolls up all_tree and then outputs every directory, including the sizes of its subdirectories
+
+    Args:
+        max_depth: only output directories this many levels below the starting directory, None for all levels
+
+        remaining args: see get_disk_threaded_usage()
+
+    Returns:
+        None
+    """
+    all_tree.rollup()
+    for idx, root in enumerate(all_tree.names):
+        if not all_tree.scanned[idx]:
+            continue
+        if max_depth is not None and all_tree.depths[idx] > max_depth:
+            continue
+        display_directory(all_tree.totals[idx],all_tree.files[idx],root,verbose,verbose_files,human,bare,csv_output,all_tree.get_ages(idx))
+
+######################################################################
+
+def save_snapshot(fname:str,root_dir:str) -> None:
+    """Writes the bytes and number of files of every directory in all_tree to a --snapshot file
+
+    Args:
+        fname: the snapshot file name
+
+        root_dir: starting directory, the snapshot stores the paths relative to it
+
+    Returns:
+        None
+    """
+    totals, files = all_tree.cumulative_totals()
+    keys = []
+    for idx, name in enumerate(all_tree.names):
+        if all_tree.scanned[idx]:
+            # the starting directory is stored as the empty path
+            rel = name[len(root_dir):].lstrip(os.sep) if idx else ""
+            keys.append((os.fsencode(rel), idx))
+    keys.sort()
+
+    with open(fname, mode="wb") as fp:
+        fp.write(SNAPSHOT_MAGIC)
+        fp.write(json.dumps({"root": os.path.abspath(root_dir), "created": int(time.time()), "dirs": len(keys)}).encode("utf-8") + b"\n")
+        previous = b""
+        for key, idx in keys:
+            prefix = len(os.path.commonprefix((previous, key)))
+            fp.write(SNAPSHOT_RECORD.pack(prefix, len(key) - prefix, all_tree.totals[idx], all_tree.files[idx], totals[idx], files[idx]))
+            fp.write(key[prefix:])
+            previous = key
+
+#############################################################################
+
+def read_snapshot(fname:str) -> Tuple[Dict[str, Any], Any]:
+    """Opens a --snapshot file
+
+    Args:
+        fname: the snapshot file name
+
+    Returns:
+        The header (root, created, dirs), and a generator of (path, bytes, files, cumulative bytes, cumulative files)
+        in sorted order, path is the encoded path relative to the root; the file is read as the generator advances
+    """
+    fp = open(fname, mode="rb")
+    if fp.readline() != SNAPSHOT_MAGIC:
+        fp.close()
+        raise ValueError("not a duu snapshot: %s" % (fname))
+    header = json.loads(fp.readline())
+
+    def records() -> Any:
+        with fp:
+            key = b""
+            while True:
+                data = fp.read(SNAPSHOT_RECORD.size)
+                if len(data) < SNAPSHOT_RECORD.size:
+                    return
+                prefix, suffix_len, total, file_count, cum_total, cum_files = SNAPSHOT_RECORD.unpack(data)
+                key = key[:prefix] + fp.read(suffix_len)
+                yield key, total, file_count, cum_total, cum_files
+
+    return header, records()
+
+#############################################################################
+
+def compare_snapshots(old_fname:str,new_fname:str,cumulative:bool,max_depth:int,human:bool,bare:bool) -> None:
+    """Merge-joins two --snapshot files and outputs the directories that grew, shrank, were created and were deleted,
+        each sorted by the change in bytes, largest first (with --top, only the TOP largest changes)
+
+    Args:
+        old_fname, new_fname: the snapshot files given to cmd-line --compare
+
+        cumulative: true if -c or -d is invoked, compare the sizes which include all subdirectories
+
+        max_depth: only compare directories this many levels below the root, None for all levels
+
+        human: true if cmd-line -H is invoked
+
+        bare: true if cmd-line -b is invoked
+
+    Returns:
+        None
+    """
+    old_header, old_records = read_snapshot(old_fname)
+    new_header, new_records = read_snapshot(new_fname)
+    # each entry: [heap of (change, path, old bytes, new bytes), number of directories, total change in bytes]
+    sections: Dict[str, List[Any]] = {"grew": [[], 0, 0], "shrank": [[], 0, 0], "new": [[], 0, 0], "deleted": [[], 0, 0]}
+    sep = os.fsencode(os.sep)
+
+    def add(section:str, change:int, key:bytes, old_bytes:int, new_bytes:int) -> None:
+        if max_depth is not None and key and key.count(sep) + 1 > max_depth:
+            return
+        entry = sections[section]
+        entry[1] += 1
+        entry[2] += new_bytes - old_bytes
+        item = (change, os.fsdecode(key) or ".", old_bytes, new_bytes)
+        if not top_count:
+            entry[0].append(item)
+        elif len(entry[0]) < top_count:
+            heapq.heappush(entry[0], item)
+        elif item > entry[0][0]:
+            heapq.heapreplace(entry[0], item)
+
+    column = 3 if cumulative else 1
+    old = next(old_records, None)
+    new = next(new_records, None)
+    # the starting directory is always the first record, its cumulative bytes are the size of the entire tree
+    net_change = (new[3] if new else 0) - (old[3] if old else 0)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            add("deleted", old[column], old[0], old[column], 0)
+            old = next(old_records, None)
+        elif old is None or new[0] < old[0]:
+            add("new", new[column], new[0], 0, new[column])
+            new = next(new_records, None)
+        else:
+            delta = new[column] - old[column]
+            if delta > 0:
+                add("grew", delta, new[0], old[column], new[column])
+            elif delta < 0:
+                add("shrank", -delta, new[0], old[column], new[column])
+            old = next(old_records, None)
+            new = next(new_records, None)
+
+    def size(n:int) -> str:
+        return convert_size(n) if human else fmt(n,0,bare)
+
+    def signed(n:int) -> str:
+        return ("-" if n < 0 else "+" if n > 0 else "") + size(abs(n))
+
+    titles = (("grew", "grew (change, old bytes, new bytes)"), ("shrank", "shrank (change, old bytes, new bytes)"),
+              ("new", "new directories (bytes)"), ("deleted", "deleted directories (bytes)"))
+    for section, title in titles:
+        heap = sections[section][0]
+        if not bare:
+            print()
+            print(title)
+            print("=" * len(title))
+        for change, name, old_bytes, new_bytes in sorted(heap, reverse=True):
+            if section in ("new", "deleted"):
+                safe_print("%s\t%s" % (signed(new_bytes - old_bytes), name))
+            else:
+                safe_print("%s\t%s\t%s\t%s" % (signed(new_bytes - old_bytes), size(old_bytes), size(new_bytes), name))
+
+    if not bare:
+        print()
+        print("summary")
+        print("=======")
+        for label, header in (("old", old_header), ("new", new_header)):
+            safe_print("%-14s: %s (%s)" % (label, header["root"], time.strftime("%Y-%m-%d %H:%M", time.localtime(header["created"]))))
+        for section, title in titles:
+            if cumulative:
+                # the changes of nested directories overlap, so they can not be added together
+                print("%-14s: %s dirs" % (section, fmt(sections[section][1],0)))
+            else:
+                print("%-14s: %s dirs, %s bytes" % (section, fmt(sections[section][1],0), signed(sections[section][2])))
+        print("net change    : %s bytes" % (signed(net_change)))
+
+######################################################################
+
+class DirectoryUsage:
+    """A single directory, as yielded by iter_disk_usage()
+        dirs and files are the names found directly in path, the remaining attributes only count those files
+    """
+    __slots__ = ("path", "depth", "dirs", "files", "file_count", "err_count", "total_bytes", "allocated_bytes", "extensions", "file_stats")
+
+    def __init__(self, path:str, depth:int, dirs:List[str], files:List[str], tallies:Tuple) -> None:
+        self.path = path
+        self.depth = depth
+        self.dirs = dirs
+        self.files = files
+        self.file_count, self.err_count, self.total_bytes, self.file_stats, self.extensions = tallies[:5]
+        self.allocated_bytes = tallies[7]
+
+    def __repr__(self) -> str:
+        return "DirectoryUsage(%r, files=%d, bytes=%d)" % (self.path, self.file_count, self.total_bytes)
+
+#############################################################################
+
+class ScanResult:
+    """Returned by scan(): every DirectoryUsage, in the order they were scanned, and the combined ScanTotals
+    """
+    __slots__ = ("root", "directories", "totals")
+
+    def __init__(self, root:str) -> None:
+        self.root = root
+        self.directories: List[DirectoryUsage] = []
+        self.totals = ScanTotals()
+
+    def add(self, usage:DirectoryUsage) -> None:
+        """Appends a directory and adds it to the totals
+        """
+        self.directories.append(usage)
+        totals = self.totals
+        totals.file_count += usage.file_count
+        totals.err_count += usage.err_count
+        totals.dir_count += 1
+        totals.total_bytes += usage.total_bytes
+        totals.allocated_bytes += usage.allocated_bytes
+        for e, n in usage.extensions.items():
+            totals.extensions[e] += n
+        if usage.file_stats is not None:
+            totals.file_stats.merge(usage.file_stats)
+
+#############################################################################
+
+def iter_disk_usage(root_dir:str=".",ext:bool=False,stats:bool=False,skipdot:bool=False,norecurse:bool=False,exclude:List[str]=None,regexpr:List[str]=None,topdown:bool=True) -> Iterator[DirectoryUsage]:
+    """Python API: scans root_dir with os.scandir in a single thread, yielding a DirectoryUsage for each directory
+        Like os.walk(), symbolic links to directories are not followed, directories that can not be listed are
+        skipped, and with topdown the subdirectories are only visited after their parent has been yielded, so
+        removing names from usage.dirs prunes the scan
+
+    Args:
+        root_dir: starting directory
+
+        ext: count the file extensions, see DirectoryUsage.extensions
+
+        stats: collect the file size statistics, see DirectoryUsage.file_stats
+
+        skipdot: skip directories starting with '.'
+
+        norecurse: only scan root_dir itself
+
+        exclude: skip directories containing any of these case-insensitive strings, see -x
+
+        regexpr: skip directories matching any of these case-insensitive regular expressions, see -X
+
+        topdown: yield each directory before its subdirectories, otherwise after them (for removing directories)
+
+    Returns:
+        A generator of DirectoryUsage, unlike the command line the subdirectories of an excluded directory are never scanned
+    """
+    excludes = [e.lower() for e in exclude or () if e]
+    regexprs = [re.compile(r, re.I) for r in regexpr or () if r]
+
+    # each entry: (directory name, depth, its DirectoryUsage once scanned when not topdown)
+    pending: List[Tuple[str, int, Any]] = [(root_dir, 0, None)]
+    while pending:
+        dname, depth, usage = pending.pop()
+        if usage is not None:
+            # not topdown, all of its subdirectories have been yielded by now
+            yield usage
+            continue
+
+        if skipdot and os.sep + "." in dname:
+            continue
+        lower = dname.lower()
+        if any(e in lower for e in excludes) or any(r.search(dname) for r in regexprs):
+            continue
+
+        try:
+            walker = scan_directory(dname)
+        except OSError:
+            continue
+        usage = DirectoryUsage(dname, depth, walker[1], walker[2], tally_directory(dname,walker[2],walker[3],ext,stats))
+        if topdown:
+            yield usage
+        else:
+            pending.append((dname, depth, usage))
+
+        if not norecurse:
+            # reversed, so that the subdirectories are visited in the order they were listed
+            for subdir in reversed(usage.dirs):
+                pending.append((join(dname,subdir), depth + 1, None))
+
+#############################################################################
+
+def scan(root_dir:str=".",**kwargs) -> ScanResult:
+    """Python API: scans root_dir and keeps every directory in memory, use iter_disk_usage() for very large trees
+
+    Args:
+        root_dir: starting directory
+
+        kwargs: see iter_disk_usage()
+
+    Returns:
+        A ScanResult, result.totals.file_stats is only populated with stats=True and result.totals.extensions with ext=True
+    """
+    result = ScanResult(root_dir)
+    for usage in iter_disk_usage(root_dir,**kwargs):
+        result.add(usage)
+    return result
 
 ######################################################################
 
@@ -499,13 +1939,31 @@ def main() -> int:
     parser.add_argument("-N", "--norecurse", help="do not recurse", action="store_true")
     parser.add_argument("-f", "--files", help="also display number of files in each directory", action="store_true")
     parser.add_argument("-S", "--stats", help="display mean, median, mode and stdev file statistics", action="store_true")
+    parser.add_argument("-P", "--percentiles", help="with -S, also display the 50th, 90th and 99th percentile file sizes", action="store_true")
     parser.add_argument("-H", "--human", help="display numbers in a more human readable format", action="store_true")
     parser.add_argument("-T", "--threads", help="number of concurrent threads, consider for SANs")
     parser.add_argument("-x", "--exclude", help="colon-separated list of case-insensitive strings to exclude")
     parser.add_argument("-X", "--regexpr", help="colon-separated list of case-insensitive regular expressions to exclude")
-    parser.add_argument("-o", "--output", help="output to CSV file")
+    parser.add_argument("-o", "--output", help="output to CSV file, rows are written while the scan is running")
+    parser.add_argument("-j", "--jsonl", help="with -o, output JSON lines with raw numbers (bytes, files, mtime) instead of CSV", action="store_true")
+    parser.add_argument("-c", "--cumulative", help="include the size of all subdirectories in each directory, similar to du", action="store_true")
+    parser.add_argument("-d", "--max-depth", help="only display directories up to MAX_DEPTH levels below dname, implies -c", type=int)
+    parser.add_argument("-W", "--scandir", help="each thread lists directories itself with os.scandir (work-stealing), instead of a single os.walk", action="store_true")
+    parser.add_argument("--processes", help="scan the subdirectories of dname with this many processes, each using -T threads; for CPU-bound scans with -X or -e", type=int, default=0)
+    parser.add_argument("--top", help="display the TOP largest files and directories", type=int, default=0)
+    parser.add_argument("-A", "--age", help="also display the bytes by file age (<30, 30-90, 90-365, >365 days), using the mtime or atime of each file", choices=("mtime", "atime"))
+    parser.add_argument("--cold", help="only display directories with at least COLD percent of bytes older than --cold-days, implies -A mtime", type=float)
+    parser.add_argument("--cold-days", help="number of days after which data is cold, default: 90", type=int, default=90)
+    parser.add_argument("-l", "--hardlinks", help="count files with multiple hard links only once, also display the allocated bytes (st_blocks) for sparse files", action="store_true")
+    parser.add_argument("--progress", help="every PROGRESS seconds, display the files/sec, dirs/sec, bytes, queue depth and busy threads on STDERR", type=float)
+    parser.add_argument("--progress-file", help="with --progress, also write each report to this JSON status file, implies --progress 5")
+    parser.add_argument("--progress-socket", help="with --progress, also send each report as a JSON line to the clients of this Unix socket, implies --progress 5")
+    parser.add_argument("--snapshot", help="save the bytes and number of files of every directory to this SNAPSHOT file, for --compare")
+    parser.add_argument("--compare", help="compare two --snapshot files instead of scanning, use with -c, -d, --top, -H", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--index", help="save directory totals to the INDEX file, later runs only rescan directories with a new modification time, implies -W")
 
     args = parser.parse_args()
+    global all_tree, want_cumulative, all_index, all_output, output_jsonl, top_count, age_field, cold_days, cold_percent, scan_day, want_hardlinks, all_progress
 
     verbose = False if args.quiet else True
     verbose = False if args.files else verbose
@@ -517,38 +1975,134 @@ def main() -> int:
     if args.regexpr:
         build_regexpr_excludes(args.regexpr)
 
+    top_count = max(args.top,0)
+
+    if args.cold is not None and not args.age:
+        args.age = "mtime"
+    if args.age:
+        age_field = "st_" + args.age
+        cold_days = args.cold_days
+        cold_percent = args.cold
+        scan_day = int(time.time() // 86400)
+
+    want_cumulative = args.cumulative or args.max_depth is not None
+    if want_cumulative or args.snapshot:
+        all_tree = DirectoryTree()
+
+    if args.compare:
+        # make sure long numbers are appropriately separated with commas
+        locale.setlocale(locale.LC_ALL, '')
+        try:
+            compare_snapshots(args.compare[0],args.compare[1],want_cumulative,args.max_depth,args.human,args.bare)
+        except (OSError, ValueError) as err:
+            safe_print("", isError=True)
+            safe_print("Error: unable to compare snapshots: %s" % (err), isError=True)
+            safe_print("", isError=True)
+            return 1
+        return 0
+
+    if args.index and not args.norecurse:
+        args.scandir = True
+
+    if args.processes and args.index:
+        safe_print("", isError=True)
+        safe_print("Error: --processes can not be used with --index", isError=True)
+        safe_print("", isError=True)
+        return 1
+
+    if args.processes and args.hardlinks:
+        safe_print("", isError=True)
+        safe_print("Error: --processes can not be used with -l, hard links are tracked by a single process", isError=True)
+        safe_print("", isError=True)
+        return 1
+    want_hardlinks = args.hardlinks
+
+    if (args.progress_file or args.progress_socket) and not args.progress:
+        args.progress = 5
+    if args.processes and args.progress:
+        safe_print("", isError=True)
+        safe_print("Error: --processes can not be used with --progress, the worker processes only report their totals when done", isError=True)
+        safe_print("", isError=True)
+        return 1
+    if args.progress_socket and not hasattr(socket, "AF_UNIX"):
+        safe_print("", isError=True)
+        safe_print("Error: --progress-socket requires Unix domain sockets", isError=True)
+        safe_print("", isError=True)
+        return 1
+
     stats_update = int(args.status) if args.status else 100
 
     # make sure long numbers are appropriately separated with commas
     locale.setlocale(locale.LC_ALL, '')
 
+    rv = 0
     if isdir(args.dname):
         try:
+            if args.index and not args.norecurse:
+                all_index = ScanIndex(args.index,args.dname)
+
+            if args.output:
+                output_jsonl = args.jsonl
+                all_output = OutputWriter(args.output,"utf-8" if args.jsonl else "latin-1")
+
+            if args.progress:
+                try:
+                    all_progress = ProgressReporter(max(args.progress,0.1),args.progress_file,args.progress_socket)
+                except OSError as err:
+                    if all_output is not None:
+                        all_output.close()
+                    safe_print("", isError=True)
+                    safe_print("Error: unable to create progress socket: %s (%s)" % (args.progress_socket,err), isError=True)
+                    safe_print("", isError=True)
+                    return 1
+
             if args.stats:
                 time_start = time.time()
             
-            get_disk_threaded_usage(args.dname,args.ext,verbose,args.status,args.nodot,args.stats,args.bare,args.norecurse,args.files,args.human,max_workers,args.exclude,args.regexpr,args.output,stats_update)
-
+            get_disk_threaded_usage(args.dname,args.ext,verbose,args.status,args.nodot,args.stats,args.bare,args.norecurse,args.files,args.human,max_workers,args.exclude,args.regexpr,args.output,stats_update,args.scandir,args.processes)
+            if all_progress is not None:
+                all_progress.close()
+            if all_index is not None:
+                all_index.save()
+            if args.snapshot:
+                save_snapshot(args.snapshot,args.dname)
+            if want_cumulative:
+                display_cumulative(args.max_depth,verbose,args.files,args.human,args.bare,args.output)
+
+            if all_output is not None and not all_output.close():
+                rv = 1
+
+            totals = merge_scan_totals()
             if args.ext:
-                unique_ext_count = display_threaded_extensions()
+                unique_ext_count = display_threaded_extensions(totals)
+
+            if top_count:
+                display_top(totals,args.human)
+
+            if age_field and not args.bare:
+                display_ages(totals)
 
             if not args.bare:
-                fcount, dcount = display_threaded_summary(unique_ext_count)
+                fcount, dcount = display_threaded_summary(totals,unique_ext_count,args.percentiles)
                 if args.stats:
                     time_end = time.time()
-                    display_runtime_statistics(time_start,time_end,fcount,dcount,max_workers)
+                    engine = "scandir" if args.scandir else "os.walk"
+                    if args.processes and not args.norecurse:
+                        engine += " in %d processes" % (args.processes)
+                    # the busy time of the worker processes would also need to be divided by --processes
+                    display_runtime_statistics(time_start,time_end,fcount,dcount,max_workers,engine,0.0 if args.processes else totals.busy_time)
 
         except KeyboardInterrupt:
+            # keep the rows that were already scanned
+            if all_output is not None:
+                all_output.close()
+            if all_progress is not None:
+                all_progress.close()
             safe_print("", isError=True)
             safe_print("", isError=True)
             safe_print("You pressed Ctrl+C", isError=True)
             safe_print("", isError=True)
             return 1
-        else:
-            if args.output:
-                with open(args.output,mode="w",encoding="latin-1") as fp:
-                    fp.write("\n".join(all_csv_list))
-                    fp.write("\n")
 
     else:
         safe_print("", isError=True)
@@ -556,7 +2110,7 @@ def main() -> int:
         safe_print("", isError=True)
         return 1
 
-    return 0
+    return rv
 
 #############################################################################
 
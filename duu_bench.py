@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+# duu_bench.py
+# Benchmark for the Directory Usage Utility (duu)
+# -John Taylor
+
+# Generates a reproducible synthetic directory tree and times each duu.py walk engine on it
+
+r"""
+examples
+--------
+1) python3 duu_bench.py
+    (a tree of depth 3 with 8 subdirectories and 50 files per directory, in /dev/shm when available)
+
+2) python3 duu_bench.py -d 4 -F 10 -n 20 -T 8 -r 5
+    (depth 4, fan-out 10, 20 files per directory, 8 threads, best of 5 runs per engine)
+
+3) python3 duu_bench.py --sizes lognormal --mean-size 65536 --engines threaded,scandir --threads 16
+    (only compare the os.walk and scandir engines, on file sizes which are mostly small with a few large ones)
+
+4) python3 duu_bench.py --keep --tmpdir /mnt/nfs/scratch
+    (benchmark another file system, the tree is not removed so that later runs can use --tree)
+
+5) python3 duu_bench.py --tree /mnt/nfs/scratch/duu-bench-abc123
+    (reuse an existing tree, nothing is generated or removed)
+
+notes
+-----
+* every engine runs duu.py in a child process, peak RSS is the ru_maxrss of that process
+  (for the processes engine, this does not include the worker processes)
+* syscall counts are collected by an extra run under strace -f -c, when strace is installed
+* files are created with os.truncate, which makes them sparse, duu.py only looks at their size
+* the first run of each engine is a warm-up, so the directories are in the OS cache for every engine
+"""
+
+import os, re, sys, argparse, random, shutil, subprocess, tempfile, time
+from typing import List, Dict, Tuple, Any
+
+pgm_version = "1.00"
+pgm_date = "Oct-20-2026 14:30"
+
+DUU = os.path.join(os.path.dirname(os.path.abspath(__file__)), "duu.py")
+
+# name: extra duu.py arguments, threaded engines also get -T threads
+ENGINES = {
+    "serial": [],
+    "threaded": ["-T"],
+    "scandir": ["-W", "-T"],
+    "processes": ["--processes", "4", "-T"],
+    "index": ["--index", None, "-T"],
+}
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+#############################################################################
+
+def create_tree(root:str,depth:int,fanout:int,files:int,sizes:str,mean_size:int,seed:int) -> Tuple[int, int, int]:
+    """Creates a synthetic directory tree, the same arguments always create the same tree
+
+    Args:
+        root: an existing, empty directory
+
+        depth: number of directory levels below root
+
+        fanout: number of subdirectories in each directory above the last level
+
+        files: number of files in each directory
+
+        sizes: fixed, uniform (0 to 2 * mean_size) or lognormal (median of mean_size / 4)
+
+        mean_size: the average file size in bytes
+
+        seed: random number seed
+
+    Returns:
+        The number of files, directories and bytes created
+    """
+    rnd = random.Random(seed)
+    file_count = dir_count = total_bytes = 0
+    pending = [(root, 0)]
+    while pending:
+        dname, level = pending.pop()
+        dir_count += 1
+        for i in range(files):
+            if "fixed" == sizes:
+                size = mean_size
+            elif "uniform" == sizes:
+                size = rnd.randint(0, 2 * mean_size)
+            else:
+                size = int(rnd.lognormvariate(0, 1.6651) * mean_size / 4)
+            fname = os.path.join(dname, "f%05d.%s" % (i, rnd.choice(("txt", "dat", "log", "jpg", "py"))))
+            with open(fname, "wb") as fp:
+                os.truncate(fp.fileno(), size)
+            file_count += 1
+            total_bytes += size
+        if level < depth:
+            for i in range(fanout):
+                subdir = os.path.join(dname, "d%03d" % (i))
+                os.mkdir(subdir)
+                pending.append((subdir, level + 1))
+
+    return file_count, dir_count, total_bytes
+
+#############################################################################
+
+def run_engine(args:List[str]) -> Tuple[float, int, str]:
+    """Runs duu.py once
+
+    Args:
+        args: the duu.py command-line arguments
+
+    Returns:
+        The elapsed seconds, the peak RSS in kilobytes and the output of duu.py
+    """
+    with tempfile.TemporaryFile() as out:
+        time_start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-W", "ignore", DUU] + args, stdout=out, stderr=subprocess.STDOUT)
+        # unlike proc.wait(), wait4 returns the resource usage of this child only
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - time_start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        output = out.read().decode("utf-8", errors="replace")
+
+    if proc.returncode:
+        raise RuntimeError("duu.py %s failed: %s" % (" ".join(args), output.strip()))
+
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    peak_rss = rusage.ru_maxrss // 1024 if "darwin" == sys.platform else rusage.ru_maxrss
+    return elapsed, peak_rss, output
+
+#############################################################################
+
+def count_syscalls(args:List[str]) -> Any:
+    """Runs duu.py once under strace, including all of its threads and processes
+
+    Args:
+        args: the duu.py command-line arguments
+
+    Returns:
+        The total number of system calls, or None when strace is not installed
+    """
+    strace = shutil.which("strace")
+    if not strace:
+        return None
+
+    with tempfile.NamedTemporaryFile(suffix=".strace") as summary:
+        subprocess.run([strace, "-f", "-c", "-o", summary.name, sys.executable, "-W", "ignore", DUU] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(summary.name) as fp:
+            calls_end = 0
+            for line in fp:
+                # the columns are right-aligned and some may be empty, so the calls column is found by its position in the header
+                if "calls" in line and "syscall" in line:
+                    calls_end = line.index("calls") + len("calls")
+                elif calls_end and line.rstrip().endswith("total"):
+                    return int(line[:calls_end].split()[-1])
+    return None
+
+#############################################################################
+
+def benchmark(tree:str,engines:List[str],threads:int,repeat:int,strace:bool,expected_files:int) -> List[Dict[str, Any]]:
+    """Times each engine on the tree, the best of repeat runs is kept
+
+    Args:
+        tree: the synthetic directory tree
+
+        engines: names from ENGINES
+
+        threads: number of threads for the threaded engines
+
+        repeat: number of timed runs of each engine
+
+        strace: count the system calls with an additional run
+
+        expected_files: the number of files in tree, each engine must report this many
+
+    Returns:
+        A dictionary of results per engine
+    """
+    results = []
+    index_fname = os.path.join(tempfile.gettempdir(), "duu-bench-%d.idx" % (os.getpid()))
+    for name in engines:
+        args = ["-q", "-S"]
+        for arg in ENGINES[name]:
+            if arg is None:
+                args.append(index_fname)
+            elif "-T" == arg:
+                args += ["-T", str(threads)]
+            else:
+                args.append(arg)
+        args.append(tree)
+
+        # also builds the index file, so the timed --index runs measure a warm index
+        run_engine(args)
+        times = []
+        peak_rss = 0
+        for i in range(repeat):
+            elapsed, rss, output = run_engine(args)
+            times.append(elapsed)
+            peak_rss = max(peak_rss, rss)
+
+        match = re.search(r"^files\s+:\s+([\d,.]+)", output, re.M)
+        files_found = int(re.sub(r"[^\d]", "", match.group(1))) if match else -1
+        if files_found != expected_files:
+            print("warning: engine %s found %d files instead of %d" % (name, files_found, expected_files), file=sys.stderr)
+
+        best = min(times)
+        results.append({"engine": name, "threads": 1 if "serial" == name else threads, "seconds": best,
+                        "files_per_sec": expected_files / best, "peak_rss": peak_rss,
+                        "syscalls": count_syscalls(args) if strace else None})
+
+    if os.path.exists(index_fname):
+        os.unlink(index_fname)
+    return results
+
+#############################################################################
+
+def display_results(results:List[Dict[str, Any]]) -> None:
+    """Outputs one line per engine
+    """
+    print()
+    print("%-10s %7s %9s %12s %10s %12s" % ("engine", "threads", "seconds", "files/sec", "peak RSS", "syscalls"))
+    print("%-10s %7s %9s %12s %10s %12s" % ("-" * 10, "-" * 7, "-" * 9, "-" * 12, "-" * 10, "-" * 12))
+    for r in results:
+        syscalls = "n/a" if r["syscalls"] is None else "{:,}".format(r["syscalls"])
+        print("%-10s %7d %9.3f %12s %8.1fMB %12s" % (r["engine"], r["threads"], r["seconds"], "{:,.0f}".format(r["files_per_sec"]), r["peak_rss"] / 1024.0, syscalls))
+
+#############################################################################
+
+def main() -> int:
+    """Process command-line arguments, create the tree, run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the duu.py walk engines on a synthetic directory tree", epilog="duu benchmark, version: %s (%s)" % (pgm_version,pgm_date))
+    parser.add_argument("-d", "--depth", help="number of directory levels, default: 3", type=int, default=3)
+    parser.add_argument("-F", "--fanout", help="number of subdirectories per directory, default: 8", type=int, default=8)
+    parser.add_argument("-n", "--files", help="number of files per directory, default: 50", type=int, default=50)
+    parser.add_argument("--sizes", help="file size distribution, default: lognormal", choices=SIZE_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--mean-size", help="average file size in bytes, default: 16384", type=int, default=16384)
+    parser.add_argument("--seed", help="random number seed, default: 1", type=int, default=1)
+    parser.add_argument("-T", "--threads", help="number of threads for the threaded engines, default: 8", type=int, default=8)
+    parser.add_argument("-r", "--repeat", help="number of timed runs per engine, the best one is reported, default: 3", type=int, default=3)
+    parser.add_argument("--engines", help="comma-separated list of engines to run, default: all of %s" % (",".join(ENGINES)), default=",".join(ENGINES))
+    parser.add_argument("--no-strace", help="do not count system calls, even when strace is installed", action="store_true")
+    parser.add_argument("--tmpdir", help="create the tree in this directory, default: /dev/shm when available")
+    parser.add_argument("--keep", help="do not remove the tree when done", action="store_true")
+    parser.add_argument("--tree", help="use this existing tree instead of creating one")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    for name in engines:
+        if name not in ENGINES:
+            print("Error: unknown engine: %s, choose from: %s" % (name, ",".join(ENGINES)), file=sys.stderr)
+            return 1
+
+    if args.tree:
+        tree = args.tree
+        print("counting files in: %s" % (tree))
+        file_count = sum(len(files) for _, _, files in os.walk(tree))
+    else:
+        tmpdir = args.tmpdir
+        if not tmpdir and os.path.isdir("/dev/shm"):
+            tmpdir = "/dev/shm"
+        tree = tempfile.mkdtemp(prefix="duu-bench-", dir=tmpdir)
+        print("creating tree in : %s" % (tree))
+        time_start = time.perf_counter()
+        file_count, dir_count, total_bytes = create_tree(tree,args.depth,args.fanout,args.files,args.sizes,args.mean_size,args.seed)
+        print("files           : {:,}".format(file_count))
+        print("directories     : {:,}".format(dir_count))
+        print("bytes           : {:,}".format(total_bytes))
+        print("created in      : %.2f seconds" % (time.perf_counter() - time_start))
+
+    try:
+        results = benchmark(tree,engines,args.threads,max(args.repeat,1),not args.no_strace,file_count)
+        display_results(results)
+    except (RuntimeError, KeyboardInterrupt) as err:
+        print("Error: %s" % (err), file=sys.stderr)
+        return 1
+    finally:
+        if not args.tree and not args.keep:
+            shutil.rmtree(tree, ignore_errors=True)
+
+    return 0
+
+#############################################################################
+
+if "__main__" == __name__:
+    sys.exit( main() )
+
+# end of script
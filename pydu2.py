@@ -4,66 +4,20 @@
 # -John Taylor
 
 # display directory disk usage in kilobytes, plus totals
+# the directories are scanned by duu.py, which must be in the same directory as this script
 
-import os, sys, locale, argparse, time, statistics
-from os.path import join, getsize, isdir, splitext
+import sys, locale, argparse, time
+from os.path import isdir
 from collections import defaultdict
 from datetime import timedelta
+from duu import iter_disk_usage, fmt, safe_print, display_file_stats, FileSizeStats
 
-pgm_version = "1.21"
-pgm_date = "Dec-31-2016 14:23"
+pgm_version = "1.22"
+pgm_date = "Oct-20-2026 16:50"
 
 #############################################################################
 
-def safe_print(data,isError=False):
-    dest = sys.stdout if not isError else sys.stderr
-    # can also use 'replace' instead of 'ignore' for errors= parameter
-    print( str(data).encode(sys.stdout.encoding, errors='ignore').decode(sys.stdout.encoding), file=dest )
-
-#############################################################################
-
-# convert 112233.4455 into 112,233.45
-def fmt(n,precision=2):
-	tmp = "%." + "%s" % (precision) + "f"
-	return locale.format(tmp, n, grouping=True)
-
-#############################################################################
-
-def display_file_stats(stats_file_sizes):
-			print("file statistics (in bytes)")
-			print("=" * 26)
-
-			try:
-				mean = statistics.mean(stats_file_sizes)
-			except:
-				print("mean          : N/A")
-			else:
-				print("mean          : %s" % fmt(mean,0))
-
-			try:
-				median = statistics.median(stats_file_sizes)
-			except:
-				print("median        : N/A")
-			else:
-				print("median        : %s" % fmt(median,0))
-
-			try:
-				mode = statistics.mode(stats_file_sizes)
-			except:
-				print("mode          : N/A")
-			else:
-				print("mode          : %s" % fmt(mode,0))
-
-			try:
-				stdev = statistics.stdev(stats_file_sizes)
-			except:
-				print("stdev         : N/A")
-			else:
-				print("stdev         : %s" % fmt(stdev,0))
-
-#############################################################################
-
-def display_summary(file_count,err_count,dir_count,total,stats,stats_file_sizes):
+def display_summary(file_count,err_count,dir_count,total,stats,file_stats):
 		print("summary")
 		print("=" * 7)
 
@@ -88,8 +42,8 @@ def display_summary(file_count,err_count,dir_count,total,stats,stats_file_sizes)
 		
 		print()
 
-		if stats and len(stats_file_sizes):
-			display_file_stats(stats_file_sizes)
+		if stats and file_stats.count:
+			display_file_stats(file_stats)
 
 #############################################################################
 
@@ -129,32 +83,20 @@ def get_disk_usage(parameter=".",want_ext=False,verbose=True,status=False,skipdo
 	dir_count = 0
 	err_count = 0
 	time_begin = time.time()
-	stats_file_sizes = []
-	dot_dir = os.sep + "."
-
-	for root, dirs, files in os.walk( parameter ):
-		if skipdot and dot_dir in root:
-			# skip directories beginning with a '.'
-			continue
-		dir_total = 0
+	file_stats = FileSizeStats()
+
+	for usage in iter_disk_usage(parameter,ext=want_ext,stats=stats,skipdot=skipdot,norecurse=norecurse):
+		root, files = usage.path, usage.files
 		dir_count += 1
-		current = 0
-		for name in files:
-			if want_ext:
-				tmp = os.path.splitext(name)[1][1:].lower()
-				extensions[tmp] += 1
-				if len(tmp) > len(longest_ext): longest_ext=tmp
-			fullname = join(root,name)
-			try:
-				current += getsize(fullname)
-				if stats:
-					stats_file_sizes.append(current)
-				file_count += 1
-			except:
-				safe_print("Error: unable to read: %s" % fullname, isError=True)
-				err_count += 1
-		total += current
-		dir_total += current
+		file_count += usage.file_count
+		err_count += usage.err_count
+		for e, n in usage.extensions.items():
+			extensions[e] += n
+			if len(e) > len(longest_ext): longest_ext=e
+		if stats:
+			file_stats.merge(usage.file_stats)
+		total += usage.total_bytes
+		dir_total = usage.total_bytes
 
 		# display directory size in kilobytes
 		if verbose: safe_print("%s\t%s" % (fmt(round(dir_total/1024.0,0),0), root))
@@ -162,8 +104,6 @@ def get_disk_usage(parameter=".",want_ext=False,verbose=True,status=False,skipdo
 
 		if status:
 			time_begin = display_status(dir_count,time_begin)
-
-		if norecurse: break
 	# end of main directory loop
 
 	locale.setlocale(locale.LC_ALL, '')
@@ -175,7 +115,7 @@ def get_disk_usage(parameter=".",want_ext=False,verbose=True,status=False,skipdo
 		if not bare: print()	
 
 	if not bare:
-		display_summary(file_count,err_count,dir_count,total,stats,stats_file_sizes)
+		display_summary(file_count,err_count,dir_count,total,stats,file_stats)
 
 	return file_count, dir_count
 
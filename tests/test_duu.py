@@ -0,0 +1,63 @@
+# test_duu.py
+# Tests for duu.py, run with: python3 -m pytest tests
+
+import os, sys, subprocess, tempfile, unittest
+
+DUU = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "duu.py")
+
+#############################################################################
+
+def run_duu(*args:str) -> str:
+    """Runs duu.py and returns its output
+    """
+    proc = subprocess.run([sys.executable, "-W", "ignore", DUU] + list(args), capture_output=True, text=True, check=True)
+    return proc.stdout
+
+def largest_directories(output:str) -> list:
+    """Returns the (size, name) rows of the --top "largest directories" section
+    """
+    lines = output.splitlines()
+    start = lines.index("largest directories") + 2
+    rows = []
+    for line in lines[start:]:
+        if "\t" not in line:
+            break
+        size, name = line.split("\t", 1)
+        rows.append((int(size.replace(",", "")), name))
+    return rows
+
+#############################################################################
+
+class TestTop(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "root")
+        os.makedirs(os.path.join(self.root, "sub"))
+        with open(os.path.join(self.root, "small.txt"), "wb") as fp:
+            fp.write(b"x" * 10)
+        with open(os.path.join(self.root, "sub", "big.dat"), "wb") as fp:
+            fp.write(b"x" * 1000)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_top_directories_direct_bytes(self) -> None:
+        rows = largest_directories(run_duu("-q", "--top", "2", self.root))
+        self.assertEqual(rows, [(1000, os.path.join(self.root, "sub")), (10, self.root)])
+
+    def test_top_directories_with_snapshot(self) -> None:
+        # --snapshot also builds the directory tree, but without -c the directories are still ranked by their own files
+        snapshot = os.path.join(self.tmp.name, "duu.snap")
+        rows = largest_directories(run_duu("-q", "--top", "2", "--snapshot", snapshot, self.root))
+        self.assertEqual(rows, [(1000, os.path.join(self.root, "sub")), (10, self.root)])
+
+    def test_top_directories_cumulative(self) -> None:
+        rows = largest_directories(run_duu("-q", "-c", "--top", "2", self.root))
+        self.assertEqual(rows, [(1010, self.root), (1000, os.path.join(self.root, "sub"))])
+
+#############################################################################
+
+if "__main__" == __name__:
+    unittest.main()
+
+# end of script